@@ -0,0 +1,105 @@
+import gzip
+import hashlib
+import json
+import os
+import threading
+from collections import Counter
+
+from http_client import Page, write_atomic
+from metrics import Metrics
+
+
+class ResponseArchive:
+    """Compressed per-URL store of raw responses, for replaying a crawl
+    offline.
+
+    Each response is one gzip file at ``<key[:2]>/<key>.gz``, where key
+    is the SHA-256 of its URL, holding a JSON header line (url, status,
+    content type, SHA-256 of the body) followed by the body as received.
+    Recording a URL again replaces its response.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, url):
+        key = hashlib.sha256(url.encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, key[:2], key + ".gz")
+
+    def add(self, url, body, status=200, content_type=None):
+        meta = {
+            "url": url,
+            "status": status,
+            "content_type": content_type,
+            "sha256": hashlib.sha256(body).hexdigest(),
+        }
+        path = self.path(url)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        data = json.dumps(meta).encode("utf-8") + b"\n" + body
+        write_atomic(path, gzip.compress(data, compresslevel=6, mtime=0))
+
+    def read(self, path):
+        with gzip.open(path, "rb") as f:
+            header, body = f.read().split(b"\n", 1)
+        return json.loads(header), body
+
+    def load(self, url):
+        """The recorded body of url, or None if it was not recorded."""
+        try:
+            meta, body = self.read(self.path(url))
+        except (OSError, ValueError):
+            return None
+        if meta.get("url") != url or hashlib.sha256(body).hexdigest() != meta.get("sha256"):
+            return None
+        return body
+
+    def pages(self):
+        """{url: body} for every recorded response."""
+        pages = {}
+        for prefix in sorted(os.listdir(self.directory)):
+            folder = os.path.join(self.directory, prefix)
+            if not os.path.isdir(folder):
+                continue
+            for name in sorted(os.listdir(folder)):
+                if name.endswith(".gz"):
+                    meta, body = self.read(os.path.join(folder, name))
+                    pages[meta["url"]] = body
+        return pages
+
+
+class ReplayClient:
+    """Stands in for the scraper's HttpClient, serving responses from a
+    ResponseArchive with no network, rate limiting or retries.
+
+    Every page counts as changed, so the scraper parses it again rather
+    than reusing the last run's record. A URL that was not recorded fails
+    like a page that could not be downloaded, or is missing with
+    missing_ok, as a probe that found no page when recording.
+    """
+
+    def __init__(self, archive, metrics=None):
+        self.archive = archive
+        self.metrics = metrics or Metrics()
+        self.retries = Counter()
+        self.failures = Counter()
+        self.lock = threading.Lock()
+
+    def get(self, url, headers=None, missing_ok=False):
+        body = self.archive.load(url)
+        if body is None and missing_ok:
+            self.metrics.inc("pages_missing")
+            return None
+        if body is None:
+            with self.lock:
+                self.failures[url] += 1
+            self.metrics.inc("failures")
+            raise LookupError(f"No recorded response for {url}")
+        self.metrics.inc("pages_replayed")
+        return Page(url, body, True)
+
+    def fetch(self, url, missing_ok=False):
+        return self.get(url, missing_ok=missing_ok)
+
+    def close(self):
+        pass
@@ -0,0 +1,438 @@
+import argparse
+import contextlib
+import glob
+import importlib.util
+import json
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import process_animals
+import scraper
+import text_normalize
+from archive import ResponseArchive
+from http_client import Page
+from json_stream import write_json_array
+from sites import get_site
+
+SITE = get_site()  # recorded pages are from the default site
+# A small response archive recorded with scraper.py --record, so results
+# are comparable between machines and runs; pass --fixtures to use a
+# crawl of your own
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), "benchmark_fixtures")
+
+# Each configuration is (label, BeautifulSoup parser, parse_only strainer)
+PARSE_CONFIGS = [
+    ("html.parser, full tree", "html.parser", None),
+    ("html.parser, strained", "html.parser", SITE.detail_strainer),
+    ("lxml, full tree", "lxml", None),
+    ("lxml, strained", "lxml", SITE.detail_strainer),
+]
+
+
+def load_recorded_pages(directory):
+    """{url: body} for every page in a scraper page cache directory, whose
+    JSON sidecars say which URL each body came from, or in a response
+    archive written by scraper.py --record."""
+    pages = ResponseArchive(directory).pages() if os.path.isdir(directory) else {}
+    for meta_path in sorted(glob.glob(os.path.join(directory, "*.json"))):
+        with open(meta_path, "r", encoding="utf-8") as f:
+            url = json.load(f).get("url", "")
+        body_path = os.path.splitext(meta_path)[0] + ".body"
+        if url and os.path.exists(body_path):
+            with open(body_path, "rb") as f:
+                pages[url] = f.read()
+    return pages
+
+
+def load_html_fixtures(directory):
+    """Load saved detail pages as (url, content) pairs.
+
+    ``directory`` is either the scraper's page cache, where the JSON
+    sidecars say which URL each body came from, a response archive, or a
+    folder of .html files.
+    """
+    fixtures = [(url, body) for url, body in load_recorded_pages(directory).items()
+                if SITE.is_detail_link(url)]
+    for html_path in sorted(glob.glob(os.path.join(directory, "*.html"))):
+        with open(html_path, "rb") as f:
+            fixtures.append((SITE.resolve(None, os.path.basename(html_path)), f.read()))
+    return fixtures
+
+
+def parse_all(fixtures, parser, strainer):
+    scraper.HTML_PARSER = parser
+    return [
+        scraper.parse_animal_detail(url, "dog", scraper.make_soup(content, url, strainer))
+        for url, content in fixtures
+    ]
+
+
+def best_of(repeat, fn, *args):
+    """Run fn repeat times and return (best seconds, last result)."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn(*args)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def bench_parse(args):
+    fixtures = load_html_fixtures(args.fixtures)
+    if not fixtures:
+        sys.exit(f"No HTML fixtures found in {args.fixtures}; record some with scraper.py --record")
+    print(f"Parsing {len(fixtures)} detail pages, best of {args.repeat}\n")
+
+    default_parser = scraper.HTML_PARSER
+    baseline_time = baseline = None
+    for label, parser, strainer in PARSE_CONFIGS:
+        if parser == "lxml" and importlib.util.find_spec("lxml") is None:
+            print(f"  {label:<24} skipped (lxml not installed)")
+            continue
+        elapsed, animals = best_of(args.repeat, parse_all, fixtures, parser, strainer)
+        if baseline is None:
+            baseline_time, baseline = elapsed, animals
+        mismatches = sum(a != b for a, b in zip(animals, baseline))
+        print(f"  {label:<24} {elapsed * 1000:8.1f} ms  {elapsed / len(fixtures) * 1000:6.2f} ms/page  "
+              f"x{baseline_time / elapsed:4.1f}  {mismatches} records differ")
+    scraper.HTML_PARSER = default_parser
+
+
+def legacy_score_animal(animal):
+    """score_animal as it was before the compiled keyword matcher, kept as
+    the reference the fast path must reproduce exactly."""
+    pa = process_animals
+    desc = text_normalize.strip_accents((animal.get("description") or "").lower())
+    age_months = animal.get("age_months")
+    size = animal.get("size")
+
+    scores = dict(pa.DEFAULT_SCORES)
+    if animal["breed"] in pa.BREED_DEFAULTS:
+        scores.update(pa.BREED_DEFAULTS[animal["breed"]])
+    for keywords, trait, delta in pa.KEYWORD_RULES:
+        for kw in keywords:
+            if kw in desc:
+                scores[trait] = scores[trait] + delta
+                break
+    if age_months is not None:
+        for (lo, hi), adjustments in pa.AGE_ADJUSTMENTS.items():
+            if lo <= age_months < hi:
+                for trait, delta in adjustments.items():
+                    scores[trait] = scores[trait] + delta
+                break
+    if size in pa.SIZE_ACTIVITY:
+        for trait, delta in pa.SIZE_ACTIVITY[size].items():
+            scores[trait] = scores[trait] + delta
+    return {k: pa.clamp(v) for k, v in scores.items()}
+
+
+FILLER = ("es un perro que vive en la protectora desde hace tiempo y busca una familia "
+          "con la que pasar el resto de su vida, le gusta estar cerca de sus cuidadores").split()
+
+
+def synthetic_animals(n, seed=0):
+    """n scraped-style records with random breeds, ages, sizes and
+    descriptions mixing rule keywords with filler text."""
+    return list(iter_synthetic_animals(n, seed))
+
+
+def iter_synthetic_animals(n, seed=0):
+    rng = random.Random(seed)
+    keywords = [kw for keywords, _, _ in process_animals.KEYWORD_RULES for kw in keywords]
+    breeds = list(process_animals.BREED_MAP) + ["Chihuahua", "Galgo X", None]
+    sizes = list(process_animals.SIZE_MAP) + [None]
+    ages = ["Menos de 1 año", None] + [f"{years} años" for years in range(1, 16)]
+    for i in range(n):
+        words = rng.choices(FILLER, k=rng.randint(40, 300))
+        for _ in range(rng.randint(0, 12)):
+            words.insert(rng.randrange(len(words) + 1), rng.choice(keywords))
+        yield {
+            "id": f"synthetic-{i}",
+            "animal_type": rng.choice(["dog", "cat"]),
+            "name": f"Animal {i}",
+            "sex": rng.choice(["Macho", "Hembra"]),
+            "breed": rng.choice(breeds),
+            "size": rng.choice(sizes),
+            "reference": str(i),
+            "age": rng.choice(ages),
+            "description": " ".join(words).capitalize() + ".",
+            "images": [],
+            "videos": [],
+            "source_url": f"https://example.org/animal/{i}/",
+        }
+
+
+def normalized(animals):
+    """Records as score_animal sees them inside process_animals.main."""
+    return [
+        {
+            "breed": process_animals.normalize_breed(animal.get("breed")),
+            "size": process_animals.normalize_size(animal.get("size")),
+            "age_months": process_animals.normalize_age_months(animal.get("age")),
+            "description": animal.get("description"),
+        }
+        for animal in animals
+    ]
+
+
+def bench_score(args):
+    with open(args.input, "r", encoding="utf-8") as f:
+        catalogues = [("catalogue", json.load(f))]
+    if args.synthetic:
+        catalogues.append((f"synthetic x{args.synthetic}", synthetic_animals(args.synthetic)))
+
+    for label, animals in catalogues:
+        records = normalized(animals)
+        print(f"{label}: {len(records)} animals, best of {args.repeat}")
+        legacy_time, legacy = best_of(args.repeat, lambda: [legacy_score_animal(a) for a in records])
+        fast_time, fast = best_of(args.repeat, lambda: [process_animals.score_animal(a) for a in records])
+        batch_time, batch = best_of(args.repeat, process_animals.score_animals, records)
+        expected = json.dumps(legacy, ensure_ascii=False)
+        identical = expected == json.dumps(fast, ensure_ascii=False) == json.dumps(batch, ensure_ascii=False)
+        engine = "numpy" if process_animals.numpy() is not None else "no numpy"
+        for name, elapsed in [("legacy score_animal", legacy_time), ("score_animal", fast_time),
+                              (f"score_animals ({engine})", batch_time)]:
+            print(f"  {name:<24} {elapsed * 1000:8.1f} ms  x{legacy_time / elapsed:4.1f}")
+        print(f"  output byte-identical: {identical}\n")
+        if not identical:
+            sys.exit(1)
+
+
+def bench_fold(args):
+    with open(args.input, "r", encoding="utf-8") as f:
+        texts = [animal["description"] for animal in json.load(f) if animal.get("description")]
+    if not texts:
+        sys.exit(f"No descriptions found in {args.input}")
+    print(f"Folding {len(texts)} descriptions ({sum(map(len, texts))} chars), best of {args.repeat}\n")
+
+    fold = text_normalize.fold
+    legacy_time, legacy = best_of(args.repeat, lambda: [text_normalize.strip_accents(t.lower()) for t in texts])
+    fold_time, folded = best_of(args.repeat, lambda: [fold(t) for t in texts])
+    for name, elapsed in [("strip_accents(lower())", legacy_time), ("fold", fold_time)]:
+        print(f"  {name:<24} {elapsed * 1000:8.2f} ms  x{legacy_time / elapsed:6.1f}")
+    identical = legacy == folded
+    print(f"  output identical: {identical}")
+    if not identical:
+        sys.exit(1)
+
+
+# ── Suite ─────────────────────────────────────────────────────────────────
+# Each benchmark runs in a fresh child process, so its peak memory is its
+# own, and reports throughput, per-item latency percentiles and peak RSS
+# growth. Results can be saved as a baseline and later runs compared
+# against it.
+
+SUITE_SIZES = [1000, 10000, 100000]
+BASELINE_FILE = os.path.join(os.path.dirname(__file__), "benchmark_baseline.json")
+TOLERANCE = 0.15  # relative slowdown or memory growth reported as a regression
+MEMORY_SLACK_MB = 2  # ignore memory differences smaller than this
+
+
+class FixtureClient:
+    """Stands in for scraper.client, serving recorded pages by URL."""
+
+    def __init__(self, pages):
+        self.pages = pages
+
+    def fetch(self, url):
+        if url not in self.pages:
+            raise LookupError(f"No recorded page for {url}")
+        return Page(url, self.pages[url], True)
+
+
+def listing_pages(pages):
+    """(url, listing path) for the recorded listing pages."""
+    found = []
+    for _, listing_path in SITE.listings:
+        found.extend((url, listing_path) for url in pages if SITE.page_number(listing_path, url) is not None)
+    return found
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def timed(items, fn):
+    """Call fn on each item; returns per-item latencies in seconds."""
+    latencies = []
+    for item in items:
+        start = time.perf_counter()
+        fn(item)
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def replay_listings(pages):
+    scraper.client = FixtureClient(pages)
+    return timed(listing_pages(pages), lambda page: scraper.get_listing_urls(*page))
+
+
+def replay_details(pages):
+    scraper.client = FixtureClient(pages)
+    urls = [url for url in pages if SITE.is_detail_link(url)]
+    return timed(urls, lambda url: scraper.parse_animal_detail(url, "dog"))
+
+
+def score_catalogue(n):
+    return timed(normalized(synthetic_animals(n)), process_animals.score_animal)
+
+
+def process_catalogue(input_path, output_path):
+    return timed([["--input", input_path, "--output", output_path]], process_animals.main)
+
+
+def measure(fn, *args):
+    """Run fn in this process, returning (latencies, peak RSS growth in MB)."""
+    before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        latencies = fn(*args)
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024  # bytes on macOS, KiB elsewhere
+    return latencies, (peak - before) / scale
+
+
+def run_benchmark(name, count, fn, *args):
+    """Run fn in a child process and summarize it as a result row."""
+    with ProcessPoolExecutor(max_workers=1) as pool:
+        latencies, peak_mb = pool.submit(measure, fn, *args).result()
+    seconds = sum(latencies)
+    result = {
+        "name": name,
+        "count": count,
+        "seconds": round(seconds, 4),
+        "throughput": round(count / seconds, 1) if seconds else None,
+        "peak_mb": round(peak_mb, 1),
+    }
+    if len(latencies) > 1:
+        for label, fraction in [("p50_ms", 0.5), ("p90_ms", 0.9), ("p99_ms", 0.99)]:
+            result[label] = round(percentile(latencies, fraction) * 1000, 3)
+    return result
+
+
+def regressions(result, baseline, tolerance):
+    """Why result is worse than its baseline row, as a list of strings.
+
+    Rows over a different number of items, say from other fixtures, are
+    not comparable and count as a regression until the baseline is saved
+    again.
+    """
+    if result["count"] != baseline.get("count"):
+        return [f"{result['count']} items vs {baseline.get('count')} in the baseline, not comparable"]
+    found = []
+    if baseline.get("throughput") and result["throughput"] < baseline["throughput"] * (1 - tolerance):
+        found.append(f"throughput {result['throughput']:.1f}/s vs {baseline['throughput']:.1f}/s")
+    if result["peak_mb"] > baseline.get("peak_mb", 0) * (1 + tolerance) + MEMORY_SLACK_MB:
+        found.append(f"peak {result['peak_mb']:.1f} MB vs {baseline['peak_mb']:.1f} MB")
+    return found
+
+
+def print_result(result, baseline, tolerance):
+    latency = " / ".join(f"{result[k]:.2f}" for k in ("p50_ms", "p90_ms", "p99_ms")) if "p50_ms" in result else "-"
+    line = (f"  {result['name']:<28} {result['count']:>7}  {result['throughput'] or 0:>10.1f}/s  "
+            f"{latency:>22}  {result['peak_mb']:>7.1f} MB")
+    if baseline is None:
+        print(line)
+        return []
+    found = regressions(result, baseline, tolerance)
+    change = result["throughput"] / baseline["throughput"] if baseline.get("throughput") else 1
+    print(f"{line}  x{change:4.2f}  {'REGRESSION: ' + '; '.join(found) if found else 'ok'}")
+    return found
+
+
+def bench_suite(args):
+    baseline = {}
+    if not args.save_baseline and os.path.exists(args.baseline):
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = {row["name"]: row for row in json.load(f)["results"]}
+
+    benchmarks = []
+    pages = load_recorded_pages(args.fixtures)
+    if pages:
+        benchmarks.append(("get_listing_urls", len(listing_pages(pages)), replay_listings, pages))
+        details = sum(SITE.is_detail_link(url) for url in pages)
+        benchmarks.append(("parse_animal_detail", details, replay_details, pages))
+    else:
+        print(f"No recorded pages in {args.fixtures}; skipping scraper benchmarks")
+    for n in args.sizes:
+        benchmarks.append((f"score_animal {n}", n, score_catalogue, n))
+
+    print(f"  {'benchmark':<28} {'items':>7}  {'throughput':>12}  {'p50 / p90 / p99 ms':>22}  {'peak':>10}")
+    results = []
+    failed = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in args.sizes:
+            input_path = os.path.join(tmp, f"animals-{n}.json")
+            write_json_array(input_path, iter_synthetic_animals(n))
+            benchmarks.append((f"process_animals.main {n}", n, process_catalogue,
+                               input_path, os.path.join(tmp, f"studied-{n}.json")))
+
+        for name, count, fn, *fn_args in benchmarks:
+            if not count:
+                continue
+            result = run_benchmark(name, count, fn, *fn_args)
+            results.append(result)
+            failed += print_result(result, baseline.get(name) if baseline else None, args.tolerance)
+
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump({"python": sys.version.split()[0], "results": results}, f, indent=2)
+        print(f"\nBaseline saved → {args.baseline}")
+    elif not baseline:
+        print(f"\nNo baseline at {args.baseline}; save one with --save-baseline")
+    elif failed:
+        print(f"\n{len(failed)} regressions beyond {args.tolerance:.0%}")
+        sys.exit(1)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark scraper and processor hot paths")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    parse = subparsers.add_parser("parse", help="HTML parsing and detail extraction")
+    parse.add_argument("--fixtures", default=FIXTURES_DIR,
+                       help="page cache, response archive or folder of saved .html detail pages "
+                            "(default: the recorded fixtures)")
+    parse.add_argument("--repeat", type=int, default=5)
+    parse.set_defaults(func=bench_parse)
+
+    score = subparsers.add_parser("score", help="score_animal against the legacy implementation")
+    score.add_argument("--input", default=process_animals.INPUT_FILE, help="scraped animals.json")
+    score.add_argument("--synthetic", type=int, default=10000,
+                       help="also score this many synthetic animals (0 to skip)")
+    score.add_argument("--repeat", type=int, default=5)
+    score.set_defaults(func=bench_score)
+
+    fold = subparsers.add_parser("fold", help="description folding against strip_accents")
+    fold.add_argument("--input", default=process_animals.INPUT_FILE, help="scraped animals.json")
+    fold.add_argument("--repeat", type=int, default=20)
+    fold.set_defaults(func=bench_fold)
+
+    suite = subparsers.add_parser("suite", help="throughput, latency and memory, against a baseline")
+    suite.add_argument("--fixtures", default=FIXTURES_DIR,
+                       help="page cache or response archive holding recorded listing and detail pages "
+                            "(default: the recorded fixtures)")
+    suite.add_argument("--sizes", type=int, nargs="+", default=SUITE_SIZES,
+                       help="synthetic catalogue sizes (default: 1000 10000 100000)")
+    suite.add_argument("--baseline", default=BASELINE_FILE, help="baseline results to compare against")
+    suite.add_argument("--save-baseline", action="store_true",
+                       help="record this run as the baseline instead of comparing")
+    suite.add_argument("--tolerance", type=float, default=TOLERANCE,
+                       help=f"relative slowdown or memory growth to flag (default: {TOLERANCE})")
+    suite.set_defaults(func=bench_suite)
+
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+import argparse
+import gzip
+import json
+import os
+
+from filter_index import build_indexes
+from http_client import write_atomic
+from json_stream import iter_json_records
+from match_index import MatchIndex
+
+# brotli and msgpack are optional; their variants are skipped without them
+try:
+    import brotli
+except ImportError:
+    brotli = None
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+INPUT_FILE = os.path.join(os.path.dirname(__file__), "output", "studied_animals.json")
+OUTPUT_DIR = os.path.join(os.path.dirname(__file__), "output", "compact")
+
+FORMAT = 1  # bump when the columnar layout changes
+
+# Fields with few distinct values, stored as indexes into a string table
+INTERNED_FIELDS = ["animal_type", "sex", "breed", "size"]
+
+# Fields a list view needs; descriptions and videos stay in the full export
+LIST_FIELDS = ["id", "animal_type", "name", "sex", "breed", "size", "age_months"]
+
+
+def minified(value):
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def columnar(animals):
+    """The records as one array per field, with INTERNED_FIELDS as indexes
+    into per-field string tables and scores as one flat array of small
+    ints, ``len(traits)`` per animal."""
+    traits = list(dict.fromkeys(trait for animal in animals for trait in animal.get("scores", ())))
+    fields = list(dict.fromkeys(key for animal in animals for key in animal if key != "scores"))
+    strings = {field: {} for field in INTERNED_FIELDS if field in fields}
+    columns = {}
+    for field in fields:
+        if field in strings:
+            table = strings[field]
+            columns[field] = [table.setdefault(animal.get(field), len(table)) for animal in animals]
+        else:
+            columns[field] = [animal.get(field) for animal in animals]
+    return {
+        "format": FORMAT,
+        "count": len(animals),
+        "strings": {field: list(table) for field, table in strings.items()},
+        "columns": columns,
+        "traits": traits,
+        "scores": [animal["scores"].get(trait) for animal in animals for trait in traits],
+    }
+
+
+def list_index(animals):
+    """List-view fields only, columnar, plus each animal's first image and
+    its thumbnail variant when the media stage produced one."""
+    index = columnar([{field: animal.get(field) for field in LIST_FIELDS} for animal in animals])
+    del index["traits"], index["scores"]
+    index["columns"]["image"] = [(animal.get("images") or [None])[0] for animal in animals]
+    if any("media" in animal for animal in animals):
+        index["columns"]["thumbnail"] = [
+            animal["media"][0]["variants"]["thumbnail"]["path"] if animal.get("media") else None
+            for animal in animals
+        ]
+    return index
+
+
+def export(input_path, output_dir):
+    """Write every compact variant of input_path into output_dir.
+    Returns {file name: size in bytes}."""
+    animals = list(iter_json_records(input_path))
+    name = os.path.splitext(os.path.basename(input_path))[0]
+    columns = columnar(animals)
+    files = {
+        f"{name}.min.json": minified(animals),
+        f"{name}.columns.json": minified(columns),
+        f"{name}.index.json": minified(list_index(animals)),
+        f"{name}.filters.json": minified(build_indexes(animals)),
+        f"{name}.vectors.json": minified(MatchIndex.from_animals(animals).to_dict()),
+    }
+    if msgpack is not None:
+        packed = dict(columns, scores=bytes(columns["scores"]))  # scores are 0-10
+        files[f"{name}.columns.msgpack"] = msgpack.packb(packed, use_bin_type=True)
+    for file_name, data in list(files.items()):
+        if file_name.endswith(".json"):
+            files[file_name + ".gz"] = gzip.compress(data, compresslevel=9, mtime=0)
+            if brotli is not None:
+                files[file_name + ".br"] = brotli.compress(data, quality=11)
+
+    os.makedirs(output_dir, exist_ok=True)
+    for file_name, data in files.items():
+        write_atomic(os.path.join(output_dir, file_name), data)
+    return {file_name: len(data) for file_name, data in files.items()}
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Write compact exports of studied animals for clients")
+    parser.add_argument("--input", default=INPUT_FILE, help="studied animals, as a JSON array or JSON Lines")
+    parser.add_argument("--output-dir", default=OUTPUT_DIR, help="where to write the compact files")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    original = os.path.getsize(args.input)
+    sizes = export(args.input, args.output_dir)
+    print(f"Compact exports of {args.input} ({original} bytes) → {args.output_dir}")
+    for file_name, size in sizes.items():
+        print(f"  {size:>9}  {size / original:6.1%}  {file_name}")
+    if brotli is None or msgpack is None:
+        print("  (install brotli and msgpack for the .br and .msgpack variants)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+import argparse
+import json
+import os
+
+from http_client import write_atomic
+from json_stream import iter_json_records
+
+INPUT_FILE = os.path.join(os.path.dirname(__file__), "output", "studied_animals.json")
+
+FORMAT = 1  # bump when the index layout changes
+
+FACETS = ["animal_type", "sex", "size", "breed", "age"]
+
+# Upper bounds in months of the age buckets, matching the app's AgeFilter
+# steps, so every "up to N" filter is a union of whole buckets
+AGE_BUCKETS = [6, 12, 24, 48, 96, 192]
+
+
+def age_bucket(age_months):
+    if age_months is None:
+        return "unknown"
+    lo = 0
+    for hi in AGE_BUCKETS:
+        if age_months <= hi:
+            return f"{lo}-{hi}"
+        lo = hi + 1
+    return f"{lo}+"
+
+
+def facet_value(animal, facet):
+    if facet == "age":
+        return age_bucket(animal.get("age_months"))
+    return animal.get(facet) or "unknown"
+
+
+def build_indexes(animals):
+    """Inverted indexes over animals: for every facet value, the sorted
+    positions of the animals that have it, plus per-value counts.
+
+    Positions index into ``ids`` (and into the input file), so combined
+    filters are intersections of small sorted int lists.
+    """
+    ids = []
+    facets = {facet: {} for facet in FACETS}
+    for position, animal in enumerate(animals):
+        ids.append(animal["id"])
+        for facet, index in facets.items():
+            index.setdefault(facet_value(animal, facet), []).append(position)
+    for facet, index in facets.items():
+        facets[facet] = dict(sorted(index.items(), key=lambda item: (-len(item[1]), str(item[0]))))
+    return {
+        "format": FORMAT,
+        "count": len(ids),
+        "ids": ids,
+        "age_buckets": AGE_BUCKETS,
+        "facets": facets,
+        "counts": {facet: {value: len(positions) for value, positions in index.items()}
+                   for facet, index in facets.items()},
+    }
+
+
+def age_buckets_up_to(max_months):
+    """The age buckets an "up to max_months" filter covers."""
+    return [age_bucket(hi) for hi in AGE_BUCKETS if hi <= max_months]
+
+
+def matching(indexes, exclude=None, **filters):
+    """Set of positions matching every filter, skipping facet ``exclude``.
+
+    Each filter is a facet value or a list of values (any of them). The
+    facet ``max_age_months`` selects the age buckets up to that age.
+    """
+    result = None
+    for facet, wanted in filters.items():
+        if wanted is None or facet == exclude:
+            continue
+        if facet == "max_age_months":
+            facet, wanted = "age", age_buckets_up_to(wanted)
+        elif not isinstance(wanted, (list, tuple, set)):
+            wanted = [wanted]
+        index = indexes["facets"][facet]
+        positions = set().union(*(index.get(value, ()) for value in wanted))
+        result = positions if result is None else result & positions
+    return set(range(indexes["count"])) if result is None else result
+
+
+def query(indexes, **filters):
+    """Ids of the animals matching filters, in catalogue order."""
+    return [indexes["ids"][position] for position in sorted(matching(indexes, **filters))]
+
+
+def facet_counts(indexes, **filters):
+    """{facet: {value: count}} for the animals matching filters, counting
+    each facet as if its own filter were not set, as filter bars show."""
+    counts = {}
+    for facet in FACETS:
+        exclude = "max_age_months" if facet == "age" and "max_age_months" in filters else facet
+        selected = matching(indexes, exclude=exclude, **filters)
+        counts[facet] = {
+            value: n for value, positions in indexes["facets"][facet].items()
+            if (n := len(selected.intersection(positions)))
+        }
+    return counts
+
+
+def write_indexes(input_path, output_path):
+    indexes = build_indexes(iter_json_records(input_path))
+    write_atomic(output_path, json.dumps(indexes, ensure_ascii=False, separators=(",", ":")).encode("utf-8"))
+    return indexes
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Build filter indexes over studied animals, or query them")
+    parser.add_argument("--input", default=INPUT_FILE, help="studied animals, as a JSON array or JSON Lines")
+    parser.add_argument("--output", default=None,
+                        help="where to write the indexes (default: <input>.filters.json)")
+    parser.add_argument("--animal-type", choices=["dog", "cat"])
+    parser.add_argument("--sex")
+    parser.add_argument("--size")
+    parser.add_argument("--breed")
+    parser.add_argument("--max-age-months", type=int)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    output = args.output or os.path.splitext(args.input)[0] + ".filters.json"
+    indexes = write_indexes(args.input, output)
+    print(f"Indexed {indexes['count']} animals → {output}")
+
+    filters = {"animal_type": args.animal_type, "sex": args.sex, "size": args.size,
+               "breed": args.breed, "max_age_months": args.max_age_months}
+    filters = {facet: value for facet, value in filters.items() if value is not None}
+    print(f"\n{len(matching(indexes, **filters))} animals match {filters or 'no filters'}")
+    for facet, counts in facet_counts(indexes, **filters).items():
+        print(f"  {facet}: " + ", ".join(f"{value} {n}" for value, n in counts.items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,311 @@
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from collections import Counter, namedtuple
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from metrics import BYTES_BUCKETS, COUNT_BUCKETS, Metrics
+
+REQUESTS_PER_SECOND = 4  # per-host token refill rate, to be polite
+BURST = 4  # per-host bucket capacity
+
+POOL_SIZE = 8  # keep-alive connections per host
+MAX_RETRIES = 3
+BACKOFF_BASE = 0.5  # seconds; doubled on every retry
+BACKOFF_MAX = 30  # seconds; also caps Retry-After
+TIMEOUT = 30
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+MISSING_STATUSES = {404, 410}  # page does not exist; not a failure when probing
+# Transient failures worth another attempt, including a body cut off or
+# garbled in transit
+RETRY_ERRORS = (
+    requests.ConnectionError,
+    requests.Timeout,
+    requests.exceptions.ChunkedEncodingError,
+    requests.exceptions.ContentDecodingError,
+)
+
+CACHE_MAX_AGE = 30 * 24 * 3600  # seconds since an entry was last used
+CACHE_MAX_BYTES = 200 * 1024 * 1024
+
+# content is the page body; changed is False when the server answered 304
+# or returned exactly the bytes we already had cached.
+Page = namedtuple("Page", ["url", "content", "changed"])
+
+
+class TokenBucket:
+    """Thread-safe token bucket; acquire() blocks until a token is available."""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class HostRateLimiter:
+    """One token bucket per host, created on first request to that host.
+
+    ``limits`` maps a host to its own (rate, capacity), e.g. what a site
+    adapter asks for; other hosts get ``rate`` and ``capacity``.
+    """
+
+    def __init__(self, rate=REQUESTS_PER_SECOND, capacity=BURST, limits=None):
+        self.rate = rate
+        self.capacity = capacity
+        self.limits = limits or {}
+        self.buckets = {}
+        self.lock = threading.Lock()
+
+    def wait(self, url):
+        host = urlsplit(url).netloc
+        with self.lock:
+            bucket = self.buckets.get(host)
+            if bucket is None:
+                rate, capacity = self.limits.get(host, (self.rate, self.capacity))
+                bucket = self.buckets[host] = TokenBucket(rate, capacity)
+        bucket.acquire()
+
+
+def retry_after_seconds(response):
+    """Parse a Retry-After header (delta-seconds or HTTP date), or None."""
+    value = response.headers.get("Retry-After") if response is not None else None
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return int(value)
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class PageCache:
+    """On-disk response cache keyed by URL.
+
+    Each entry is a body file plus a JSON sidecar holding the validators
+    (ETag, Last-Modified) and a SHA-256 of the body. File mtimes record
+    when an entry was last used, which drives age- and size-based eviction.
+    """
+
+    def __init__(self, directory, max_age=CACHE_MAX_AGE, max_bytes=CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_age = max_age
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+    def paths(self, url):
+        key = hashlib.sha256(url.encode("utf-8")).hexdigest()
+        base = os.path.join(self.directory, key)
+        return base + ".json", base + ".body"
+
+    def load(self, url):
+        """Return (meta, body) for url, or None if it is not cached."""
+        meta_path, body_path = self.paths(url)
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            with open(body_path, "rb") as f:
+                body = f.read()
+        except (OSError, ValueError):
+            return None
+        if hashlib.sha256(body).hexdigest() != meta.get("sha256"):
+            return None
+        return meta, body
+
+    def store(self, url, response, body):
+        meta = {
+            "url": url,
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+            "sha256": hashlib.sha256(body).hexdigest(),
+        }
+        meta_path, body_path = self.paths(url)
+        write_atomic(body_path, body)
+        write_atomic(meta_path, json.dumps(meta).encode("utf-8"))
+
+    def touch(self, url):
+        for path in self.paths(url):
+            try:
+                os.utime(path)
+            except OSError:
+                pass
+
+    def evict(self):
+        """Drop entries unused for max_age, then the least recently used
+        ones until the cache fits in max_bytes. Returns entries removed."""
+        entries = {}
+        for name in os.listdir(self.directory):
+            key, ext = os.path.splitext(name)
+            if ext not in (".json", ".body"):
+                continue
+            stat = os.stat(os.path.join(self.directory, name))
+            used, size = entries.get(key, (0, 0))
+            entries[key] = (max(used, stat.st_mtime), size + stat.st_size)
+
+        cutoff = time.time() - self.max_age
+        total = sum(size for _, size in entries.values())
+        removed = 0
+        for key, (used, size) in sorted(entries.items(), key=lambda item: item[1][0]):
+            if used >= cutoff and total <= self.max_bytes:
+                break
+            for ext in (".json", ".body"):
+                try:
+                    os.remove(os.path.join(self.directory, key + ext))
+                except OSError:
+                    pass
+            total -= size
+            removed += 1
+        return removed
+
+
+def write_atomic(path, data):
+    tmp = f"{path}.{threading.get_ident()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+class HttpClient:
+    """Shared, pooled HTTP session with rate limiting and retries.
+
+    Connection errors, timeouts, 429 and 5xx responses are retried with
+    exponential backoff and full jitter, honouring Retry-After when the
+    server sends one. Retries and final failures are counted per URL.
+    Time spent waiting for the rate limiter, on the network and backing
+    off, plus bytes downloaded, are recorded in ``metrics``. With an
+    ``archive`` (see archive.ResponseArchive), every response body is
+    also recorded there for offline replay.
+    """
+
+    def __init__(self, headers=None, pool_size=POOL_SIZE, max_retries=MAX_RETRIES,
+                 backoff_base=BACKOFF_BASE, backoff_max=BACKOFF_MAX, timeout=TIMEOUT,
+                 rate_limiter=None, cache=None, metrics=None, archive=None):
+        self.session = requests.Session()
+        self.session.headers.update(headers or {})
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.timeout = timeout
+        self.rate_limiter = rate_limiter or HostRateLimiter()
+        self.cache = cache
+        self.archive = archive
+        self.metrics = metrics or Metrics()
+        self.retries = Counter()
+        self.failures = Counter()
+        self.lock = threading.Lock()
+
+    def backoff(self, attempt, response=None):
+        retry_after = retry_after_seconds(response)
+        if retry_after is not None:
+            return min(self.backoff_max, retry_after)
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def get(self, url, headers=None, missing_ok=False):
+        """GET url, retrying transient errors. Raises on final failure, and
+        on any other error at once; either counts as a failure.
+
+        With missing_ok, a 404 or 410 returns None instead of raising and
+        is not counted as a failure, for probing pages that may not exist.
+        """
+        metrics = self.metrics
+        attempt = 0
+        while True:
+            with metrics.timer("rate_limit_wait_seconds"):
+                self.rate_limiter.wait(url)
+            response = None
+            metrics.inc("requests")
+            try:
+                with metrics.timer("fetch_seconds"):
+                    response = self.session.get(url, headers=headers, timeout=self.timeout)
+                metrics.observe("fetch_bytes", len(response.content), BYTES_BUCKETS)
+                if response.status_code not in RETRY_STATUSES:
+                    if missing_ok and response.status_code in MISSING_STATUSES:
+                        metrics.inc("pages_missing")
+                        return None
+                    response.raise_for_status()
+                    metrics.observe("retries_per_request", attempt, COUNT_BUCKETS)
+                    if self.archive is not None and response.status_code != 304:
+                        self.archive.add(url, response.content, response.status_code,
+                                         response.headers.get("Content-Type"))
+                    return response
+                error = requests.HTTPError(f"{response.status_code} {response.reason} for url: {url}",
+                                           response=response)
+            except RETRY_ERRORS as e:
+                error = e
+            except Exception:
+                self.count(self.failures, url)
+                raise
+
+            if attempt >= self.max_retries:
+                self.count(self.failures, url)
+                raise error
+            delay = self.backoff(attempt, response)
+            attempt += 1
+            self.count(self.retries, url)
+            print(f"  Retry {attempt}/{self.max_retries} for {url} in {delay:.1f}s ({error})")
+            metrics.observe("backoff_seconds", delay)
+            time.sleep(delay)
+
+    def fetch(self, url, missing_ok=False):
+        """GET url as a Page, revalidating against the page cache if any.
+        Returns None for a missing page with missing_ok, see get."""
+        cached = self.cache.load(url) if self.cache else None
+        headers = {}
+        if cached:
+            meta, body = cached
+            if meta.get("etag"):
+                headers["If-None-Match"] = meta["etag"]
+            if meta.get("last_modified"):
+                headers["If-Modified-Since"] = meta["last_modified"]
+
+        response = self.get(url, headers=headers, missing_ok=missing_ok)
+        if response is None:
+            return None
+        if response.status_code == 304 and cached:
+            self.cache.touch(url)
+            self.metrics.inc("pages_not_modified")
+            if self.archive is not None:
+                self.archive.add(url, body)
+            return Page(url, body, False)
+
+        content = response.content
+        if not self.cache:
+            return Page(url, content, True)
+        changed = not cached or hashlib.sha256(content).hexdigest() != meta["sha256"]
+        self.cache.store(url, response, content)
+        self.metrics.inc("pages_changed" if changed else "pages_unchanged")
+        return Page(url, content, changed)
+
+    def count(self, counter, url):
+        with self.lock:
+            counter[url] += 1
+        self.metrics.inc("retries" if counter is self.retries else "failures")
+
+    def close(self):
+        self.session.close()
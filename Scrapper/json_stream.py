@@ -0,0 +1,158 @@
+import json
+import os
+import threading
+
+
+def write_json_array(path, records, indent=2):
+    """Stream records into a JSON array file, atomically.
+
+    Records are serialized one at a time into a temporary file that then
+    replaces ``path``, so readers never see a half-written file. The
+    result is byte-identical to ``json.dump(list(records), f, indent=2)``.
+    Returns the number of records written.
+    """
+    tmp = path + ".tmp"
+    count = 0
+    pad = " " * indent
+    with open(tmp, "w", encoding="utf-8") as f:
+        for record in records:
+            text = json.dumps(record, ensure_ascii=False, indent=indent)
+            f.write(",\n" if count else "[\n")
+            f.write(pad + text.replace("\n", "\n" + pad))
+            count += 1
+        f.write("\n]" if count else "[]")
+    os.replace(tmp, path)
+    return count
+
+
+def write_json_lines(path, records):
+    """Stream records into a JSON Lines file, atomically. Returns the count."""
+    tmp = path + ".tmp"
+    count = 0
+    with open(tmp, "w", encoding="utf-8") as f:
+        for record in records:
+            f.write(json.dumps(record, ensure_ascii=False))
+            f.write("\n")
+            count += 1
+    os.replace(tmp, path)
+    return count
+
+
+def write_records(path, records):
+    """Write JSON Lines for a .jsonl path, a pretty-printed JSON array otherwise."""
+    if path.endswith(".jsonl"):
+        return write_json_lines(path, records)
+    return write_json_array(path, records)
+
+
+def iter_json_records(path, chunk_size=1 << 16):
+    """Yield the objects of a JSON array file, or of a JSON Lines file,
+    one at a time without loading the whole file.
+
+    Array elements are decoded incrementally from a sliding buffer, so
+    only the record being decoded needs to fit in memory.
+    """
+    decoder = json.JSONDecoder()
+    with open(path, "r", encoding="utf-8") as f:
+        buf = f.read(chunk_size)
+        stripped = buf.lstrip()
+        if not stripped.startswith("["):
+            f.seek(0)
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+            return
+
+        buf = stripped[1:]
+        eof = False
+        while True:
+            buf = buf.lstrip(" \t\r\n,")
+            if buf.startswith("]"):
+                return
+            try:
+                record, end = decoder.raw_decode(buf)
+            except ValueError:
+                if eof:
+                    raise
+                more = f.read(chunk_size)
+                eof = not more
+                buf += more
+                continue
+            if not eof and (end == len(buf) or buf[end] not in " \t\r\n,]"):
+                # A number cut by the end of the buffer decodes as a
+                # shorter one ("45" of "456", "1" of "1.5"); only trust a
+                # value that a delimiter ends
+                more = f.read(chunk_size)
+                eof = not more
+                buf += more
+                continue
+            yield record
+            buf = buf[end:]
+            if len(buf) < chunk_size and not eof:
+                more = f.read(chunk_size)
+                eof = not more
+                buf += more
+
+
+class JsonlCheckpoint:
+    """Append-only JSON Lines file of records, indexed by one of their fields.
+
+    Only byte offsets are kept in memory, so the file can hold far more
+    records than we want resident at once. With ``resume`` an existing
+    file is kept: its records are indexed and a torn last line (from a
+    crash mid-write) is truncated away. Otherwise the file starts empty.
+    Appends are thread-safe and flushed immediately.
+    """
+
+    def __init__(self, path, key, resume=False):
+        self.path = path
+        self.key = key
+        self.index = {}
+        self.lock = threading.Lock()
+        if not resume and os.path.exists(path):
+            os.remove(path)
+        self.file = open(path, "a+b")
+        self.file.seek(0)
+        good = 0
+        for line in iter(self.file.readline, b""):
+            try:
+                record = json.loads(line)
+            except ValueError:
+                break
+            if not line.endswith(b"\n"):
+                break
+            self.index[record[key]] = good
+            good += len(line)
+        self.file.truncate(good)
+
+    def __contains__(self, key):
+        return key in self.index
+
+    def __len__(self):
+        return len(self.index)
+
+    def append(self, record):
+        line = (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+        with self.lock:
+            self.file.seek(0, os.SEEK_END)
+            offset = self.file.tell()
+            self.file.write(line)
+            self.file.flush()
+            self.index[record[self.key]] = offset
+
+    def get(self, key):
+        with self.lock:
+            self.file.seek(self.index[key])
+            return json.loads(self.file.readline())
+
+    def records(self, keys):
+        """Yield the records for keys, in the order given."""
+        for key in keys:
+            yield self.get(key)
+
+    def close(self):
+        self.file.close()
+
+    def remove(self):
+        self.close()
+        os.remove(self.path)
@@ -0,0 +1,204 @@
+import argparse
+import heapq
+import json
+import math
+import os
+import time
+
+from http_client import write_atomic
+from json_stream import iter_json_records
+
+# NumPy is optional; without it queries scan the vectors in pure Python
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+INPUT_FILE = os.path.join(os.path.dirname(__file__), "output", "studied_animals.json")
+
+FORMAT = 1  # bump when the exported layout changes
+
+METRICS = ["distance", "cosine"]
+DECIMALS = 9
+
+
+class MatchIndex:
+    """Trait score vectors of every animal, in a fixed trait order, for
+    top-k matching against a preference vector.
+
+    ``distance`` ranks animals by weighted Euclidean distance between
+    their scores and the preferred levels (0-10) of the traits given;
+    ``cosine`` by the angle between them. Similarities are in 0-1. The
+    vectors are kept as a matrix, with a row-normalized copy for
+    cosine queries over every trait, so a query is one matrix product.
+    Similarities are rounded to 9 decimals so that ties, which keep
+    catalogue order, are the same with and without NumPy.
+    """
+
+    def __init__(self, ids, traits, vectors, animal_types):
+        self.ids = list(ids)
+        self.traits = list(traits)
+        self.trait_index = {trait: i for i, trait in enumerate(self.traits)}
+        self.vectors = [tuple(vector) for vector in vectors]
+        self.animal_types = list(animal_types)
+        self.norms = [math.sqrt(sum(v * v for v in vector)) or 1.0 for vector in self.vectors]
+        if np is not None:
+            self.matrix = np.array(self.vectors, dtype=np.float64).reshape(len(self.ids), len(self.traits))
+            self.unit = self.matrix / np.array(self.norms)[:, None]
+            self.type_array = np.array(self.animal_types)
+
+    @classmethod
+    def from_animals(cls, animals):
+        animals = list(animals)
+        traits = list(dict.fromkeys(trait for animal in animals for trait in animal["scores"]))
+        return cls(
+            [animal["id"] for animal in animals],
+            traits,
+            [[animal["scores"].get(trait, 0) for trait in traits] for animal in animals],
+            [animal["animal_type"] for animal in animals],
+        )
+
+    @classmethod
+    def load(cls, path):
+        """A MatchIndex from an exported vectors file, or from studied animals."""
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except ValueError:  # JSON Lines
+            data = None
+        if not isinstance(data, dict):
+            return cls.from_animals(data if data is not None else iter_json_records(path))
+        width = len(data["traits"])
+        flat = data["vectors"]
+        vectors = [flat[i:i + width] for i in range(0, len(flat), width)]
+        return cls(data["ids"], data["traits"], vectors, data["animal_types"])
+
+    def to_dict(self):
+        return {
+            "format": FORMAT,
+            "traits": self.traits,
+            "ids": self.ids,
+            "animal_types": self.animal_types,
+            "vectors": [v for vector in self.vectors for v in vector],
+        }
+
+    def query_vector(self, preferences, weights=None):
+        """(target, weight) lists over all traits; traits without a
+        preference get weight 0."""
+        unknown = (set(preferences) | set(weights or ())) - set(self.trait_index)
+        if unknown:
+            raise ValueError(f"Unknown traits: {sorted(unknown)}; expected some of {self.traits}")
+        target = [float(preferences.get(trait, 0)) for trait in self.traits]
+        weight = [float((weights or {}).get(trait, 1)) if trait in preferences else 0.0 for trait in self.traits]
+        return target, weight
+
+    def top_k(self, preferences, k=10, metric="distance", weights=None, animal_type=None):
+        """The k best matches for preferences ({trait: level 0-10}) as
+        (id, similarity) pairs, best first; ties keep catalogue order."""
+        if metric not in METRICS:
+            raise ValueError(f"Unknown metric {metric!r}; expected one of {METRICS}")
+        target, weight = self.query_vector(preferences, weights)
+        if not any(weight):
+            raise ValueError("No preferences given")
+        if np is None:
+            ranked = self.rank_python(target, weight, k, metric, animal_type)
+        else:
+            ranked = self.rank_numpy(target, weight, k, metric, animal_type)
+        return [(self.ids[position], similarity) for position, similarity in ranked]
+
+    def rank_numpy(self, target, weight, k, metric, animal_type):
+        target = np.array(target)
+        weight = np.array(weight)
+        if metric == "distance":
+            squared = ((self.matrix - target) ** 2) @ weight
+            similarity = 1 - np.sqrt(squared / (100 * weight.sum()))
+        elif weight.all() and (weight == weight[0]).all():
+            similarity = self.unit @ (target / (np.linalg.norm(target) or 1))
+        else:
+            scale = np.sqrt(weight)
+            rows = self.matrix * scale
+            query = target * scale
+            norms = np.linalg.norm(rows, axis=1)
+            norms[norms == 0] = 1
+            similarity = rows @ query / (norms * (np.linalg.norm(query) or 1))
+        similarity = np.round(similarity, DECIMALS)
+        if animal_type is not None:
+            similarity = np.where(self.type_array == animal_type, similarity, -np.inf)
+        k = min(k, int(np.isfinite(similarity).sum()))
+        if k <= 0:
+            return []
+        kth = -np.partition(-similarity, k - 1)[k - 1]
+        best = np.flatnonzero(similarity >= kth)  # may hold extra ties for kth place
+        best = best[np.lexsort((best, -similarity[best]))][:k]
+        return [(int(position), float(similarity[position])) for position in best]
+
+    def rank_python(self, target, weight, k, metric, animal_type):
+        total = sum(weight)
+        query_norm = math.sqrt(sum(w * t * t for t, w in zip(target, weight))) or 1
+
+        def similarity(vector):
+            if metric == "distance":
+                squared = sum(w * (v - t) ** 2 for v, t, w in zip(vector, target, weight))
+                return 1 - math.sqrt(squared / (100 * total))
+            norm = math.sqrt(sum(w * v * v for v, w in zip(vector, weight))) or 1
+            return sum(w * v * t for v, t, w in zip(vector, target, weight)) / (norm * query_norm)
+
+        candidates = (
+            (round(similarity(vector), DECIMALS), position)
+            for position, vector in enumerate(self.vectors)
+            if animal_type is None or self.animal_types[position] == animal_type
+        )
+        best = heapq.nsmallest(k, candidates, key=lambda item: (-item[0], item[1]))
+        return [(position, score) for score, position in best]
+
+
+def write_index(input_path, output_path):
+    index = MatchIndex.from_animals(iter_json_records(input_path))
+    write_atomic(output_path, json.dumps(index.to_dict(), ensure_ascii=False, separators=(",", ":")).encode("utf-8"))
+    return index
+
+
+def parse_preferences(pairs):
+    preferences = {}
+    for pair in pairs:
+        trait, sep, level = pair.partition("=")
+        if not sep:
+            raise argparse.ArgumentTypeError(f"Expected trait=level, got {pair!r}")
+        preferences[trait] = float(level)
+    return preferences
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Build a trait vector index of studied animals, or query it")
+    parser.add_argument("--input", default=INPUT_FILE,
+                        help="studied animals, or a vectors file written by --output")
+    parser.add_argument("--output", default=None, help="write the vectors file here")
+    parser.add_argument("preferences", nargs="*", metavar="trait=level",
+                        help="preferred trait levels 0-10, e.g. friendly=9 energy=3")
+    parser.add_argument("-k", type=int, default=10, help="matches to return (default: 10)")
+    parser.add_argument("--metric", choices=METRICS, default="distance")
+    parser.add_argument("--animal-type", choices=["dog", "cat"])
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.output:
+        index = write_index(args.input, args.output)
+        print(f"Indexed {len(index.ids)} animals over {len(index.traits)} traits → {args.output}")
+    else:
+        index = MatchIndex.load(args.input)
+    if not args.preferences:
+        return
+
+    preferences = parse_preferences(args.preferences)
+    start = time.perf_counter()
+    matches = index.top_k(preferences, args.k, args.metric, animal_type=args.animal_type)
+    elapsed = time.perf_counter() - start
+    print(f"Top {len(matches)} of {len(index.ids)} animals in {elapsed * 1000:.3f} ms:")
+    for animal_id, similarity in matches:
+        print(f"  {similarity:6.1%}  {animal_id}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+import hashlib
+import io
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from http_client import write_atomic
+
+# Pillow is only needed for the optional media stage
+try:
+    from PIL import Image, ImageOps, features
+except ImportError:
+    Image = None
+
+MEDIA_WORKERS = 4  # concurrent image downloads
+
+# Variant name -> longest edge in pixels; images are never upscaled
+VARIANTS = {
+    "thumbnail": 240,
+    "card": 640,
+}
+
+FORMATS = {
+    "webp": ("WEBP", {"quality": 80, "method": 4}),
+    "jpeg": ("JPEG", {"quality": 82, "optimize": True, "progressive": True}),
+}
+
+
+def default_format():
+    """webp when Pillow was built with it, jpeg otherwise."""
+    return "webp" if Image is not None and features.check("webp") else "jpeg"
+
+
+class MediaStore:
+    """Content-addressed store of resized image variants.
+
+    Originals are identified by the SHA-256 of their bytes, so an image
+    linked from several URLs or animals is processed once. Variants live
+    at ``<sha[:2]>/<sha>-<variant>.<ext>`` and index.json remembers which
+    source URL had which hash, and each hash's dimensions and variants,
+    so images already in the store are not downloaded again.
+    """
+
+    def __init__(self, directory, image_format=None):
+        if Image is None:
+            raise RuntimeError("The media stage needs Pillow: pip install Pillow")
+        self.directory = directory
+        self.format = image_format or default_format()
+        self.index_path = os.path.join(directory, "index.json")
+        os.makedirs(directory, exist_ok=True)
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            index = {}
+        self.urls = index.get("urls", {})
+        self.images = index.get("images", {})
+        self.processing = set()  # hashes being resized right now
+        self.lock = threading.Lock()
+
+    def entry(self, url):
+        """The stored entry for a source URL, or None if not processed."""
+        sha = self.urls.get(url)
+        image = self.images.get(sha)
+        if image is None or self.format not in image["variants"]:
+            return None
+        return dict(image, source=url, sha256=sha, variants=image["variants"][self.format])
+
+    def add(self, url, body):
+        """Store the variants of an image downloaded from url.
+        Returns True if the content was new to the store."""
+        sha = hashlib.sha256(body).hexdigest()
+        with self.lock:
+            self.urls[url] = sha
+            image = self.images.get(sha)
+            if sha in self.processing or (image is not None and self.format in image["variants"]):
+                return False
+            self.processing.add(sha)
+
+        try:
+            variants, width, height = self.make_variants(body, sha)
+        finally:
+            with self.lock:
+                self.processing.discard(sha)
+        with self.lock:
+            image = self.images.setdefault(sha, {"width": width, "height": height, "variants": {}})
+            image["variants"][self.format] = variants
+        return True
+
+    def make_variants(self, body, sha):
+        with Image.open(io.BytesIO(body)) as original:
+            picture = ImageOps.exif_transpose(original)
+            width, height = picture.size
+            if picture.mode != "RGB":
+                picture = picture.convert("RGB")
+            variants = {}
+            for name, edge in VARIANTS.items():
+                variant = picture.copy()
+                variant.thumbnail((edge, edge), Image.LANCZOS)
+                variants[name] = self.save(variant, sha, name)
+        return variants, width, height
+
+    def save(self, picture, sha, name):
+        pil_format, options = FORMATS[self.format]
+        path = os.path.join(sha[:2], f"{sha}-{name}.{'jpg' if self.format == 'jpeg' else self.format}")
+        buffer = io.BytesIO()
+        picture.save(buffer, pil_format, **options)
+        os.makedirs(os.path.join(self.directory, sha[:2]), exist_ok=True)
+        write_atomic(os.path.join(self.directory, path), buffer.getvalue())
+        return {"path": path.replace(os.sep, "/"), "width": picture.width, "height": picture.height,
+                "bytes": buffer.tell()}
+
+    def save_index(self):
+        with self.lock:
+            index = {"urls": self.urls, "images": self.images}
+        write_atomic(self.index_path, json.dumps(index, indent=1, sort_keys=True).encode("utf-8"))
+
+
+def process_images(urls, client, store, workers=MEDIA_WORKERS, metrics=None):
+    """Download and store the images at urls not yet in the store, on a
+    bounded thread pool. Images are resized on the pool too, as Pillow
+    releases the GIL while it works. Returns the number that failed."""
+    urls = list(dict.fromkeys(urls))
+    missing = [url for url in urls if store.entry(url) is None]
+    print(f"{len(missing)} images to download, {len(urls) - len(missing)} already stored")
+
+    def fetch(url):
+        return url, store.add(url, client.get(url).content)
+
+    failed = 0
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        futures = [pool.submit(fetch, url) for url in missing]
+        for future in futures:
+            try:
+                url, new = future.result()
+            except Exception as e:
+                print(f"  ERROR storing image: {e}")
+                failed += 1
+                continue
+            if metrics is not None:
+                metrics.inc("images_stored" if new else "images_deduplicated")
+            print(f"  {'Stored' if new else 'Duplicate'}: {url}")
+    store.save_index()
+    return failed
+
+
+def attach_media(animal, store):
+    """The animal with a ``media`` list: one entry per stored image, in the
+    order of ``images``, with the original's dimensions and its variants."""
+    media = [store.entry(url) for url in animal["images"]]
+    return dict(animal, media=[entry for entry in media if entry is not None])
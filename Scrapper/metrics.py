@@ -0,0 +1,166 @@
+import json
+import os
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+# Bucket upper bounds, Prometheus style (an implicit +Inf bucket follows)
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+BYTES_BUCKETS = (1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10)
+
+PREFIX = "petshelter_scrape"
+
+
+class Histogram:
+    """Bucketed distribution of observed values, with count, sum, min and max."""
+
+    def __init__(self, buckets=SECONDS_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0
+        self.min = None
+        self.max = None
+
+    def observe(self, value):
+        index = 0
+        while index < len(self.buckets) and value > self.buckets[index]:
+            index += 1
+        self.counts[index] += 1
+        self.count += 1
+        self.sum += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q-quantile (the maximum
+        for the +Inf bucket), or None when empty."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def cumulative(self):
+        """(upper bound, observations <= bound) pairs, ending with +Inf."""
+        total = 0
+        pairs = []
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            total += count
+            pairs.append((bound, total))
+        return pairs
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 6),
+            "mean": round(self.sum / self.count, 6) if self.count else None,
+            "min": self.min,
+            "max": self.max,
+            "p50": self.quantile(0.5),
+            "p90": self.quantile(0.9),
+            "p99": self.quantile(0.99),
+            "buckets": {format_bound(bound): count for bound, count in self.cumulative()},
+        }
+
+
+def format_bound(bound):
+    return "+Inf" if bound == float("inf") else repr(bound)
+
+
+class Metrics:
+    """Thread-safe registry of histograms, counters and phase timings for
+    one scrape run, exportable as JSON or as a Prometheus textfile."""
+
+    def __init__(self):
+        self.histograms = {}
+        self.counters = Counter()
+        self.phases = {}
+        self.started = time.time()
+        self.lock = threading.Lock()
+
+    def observe(self, name, value, buckets=SECONDS_BUCKETS):
+        with self.lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram(buckets)
+            histogram.observe(value)
+
+    def inc(self, name, amount=1):
+        with self.lock:
+            self.counters[name] += amount
+
+    @contextmanager
+    def timer(self, name):
+        """Observe the seconds spent in the block into histogram name."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start)
+
+    @contextmanager
+    def phase(self, name):
+        """Add the wall time spent in the block to phase name."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            with self.lock:
+                self.phases[name] = self.phases.get(name, 0) + elapsed
+
+    def summary(self):
+        with self.lock:
+            return {
+                "started": self.started,
+                "duration_seconds": round(time.time() - self.started, 6),
+                "phases": {name: round(seconds, 6) for name, seconds in self.phases.items()},
+                "counters": dict(sorted(self.counters.items())),
+                "histograms": {name: h.summary() for name, h in sorted(self.histograms.items())},
+            }
+
+    def write_json(self, path, **extra):
+        """Write summary() plus any extra top-level fields to path."""
+        summary = self.summary()
+        summary.update(extra)
+        write_text(path, json.dumps(summary, ensure_ascii=False, indent=2))
+
+    def write_prometheus(self, path):
+        """Write the run in the Prometheus text format, for node exporter's
+        textfile collector. Counters are per run, so they are gauges."""
+        summary = self.summary()
+        lines = [
+            f"# TYPE {PREFIX}_last_run_timestamp_seconds gauge",
+            f"{PREFIX}_last_run_timestamp_seconds {summary['started'] + summary['duration_seconds']:.3f}",
+            f"# TYPE {PREFIX}_duration_seconds gauge",
+            f"{PREFIX}_duration_seconds {summary['duration_seconds']}",
+            f"# TYPE {PREFIX}_phase_seconds gauge",
+        ]
+        lines += [f'{PREFIX}_phase_seconds{{phase="{name}"}} {seconds}'
+                  for name, seconds in summary["phases"].items()]
+        for name, value in summary["counters"].items():
+            lines += [f"# TYPE {PREFIX}_{name} gauge", f"{PREFIX}_{name} {value}"]
+        with self.lock:
+            histograms = sorted(self.histograms.items())
+            for name, histogram in histograms:
+                metric = f"{PREFIX}_{name}"
+                lines.append(f"# TYPE {metric} histogram")
+                lines += [f'{metric}_bucket{{le="{format_bound(bound)}"}} {count}'
+                          for bound, count in histogram.cumulative()]
+                lines += [f"{metric}_sum {histogram.sum}", f"{metric}_count {histogram.count}"]
+        write_text(path, "\n".join(lines) + "\n")
+
+
+def write_text(path, text):
+    """Write text atomically, so collectors never read a partial file."""
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp, path)
@@ -0,0 +1,304 @@
+import json
+import multiprocessing
+import os
+import queue
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+
+import process_animals
+import scraper
+from json_stream import JsonlCheckpoint, write_json_array, write_records
+from media import MediaStore, attach_media, process_images
+
+STUDIED_CHECKPOINT_FILE = os.path.join(scraper.OUTPUT_DIR, "studied_animals.checkpoint.jsonl")
+
+PARSE_WORKERS = os.cpu_count() or 1  # processes parsing detail pages
+QUEUE_SIZE = 64  # items buffered between two stages before the earlier one waits
+
+DONE = object()  # end-of-stream marker passed down the queues
+
+
+def timed_parse(url, animal_type, content, site):
+    """scraper.parse_detail_html, also returning the seconds it took."""
+    start = time.perf_counter()
+    animal = scraper.parse_detail_html(url, animal_type, content, site)
+    return animal, time.perf_counter() - start
+
+
+def parse_args(argv=None):
+    parser = scraper.build_parser(add_help=False)
+    parser.description = "Scrape, parse and score adoptable animals in one pipelined run"
+    parser.add_argument("-h", "--help", action="help", help="show this help message and exit")
+    parser.add_argument("--parse-workers", type=int, default=PARSE_WORKERS,
+                        help=f"processes parsing detail pages; 1 parses in this process (default: {PARSE_WORKERS})")
+    parser.add_argument("--queue-size", type=int, default=QUEUE_SIZE,
+                        help=f"pages or records buffered between stages (default: {QUEUE_SIZE})")
+    parser.add_argument("--chunk-size", type=int, default=process_animals.CHUNK_SIZE,
+                        help="most records scored as one batch")
+    parser.add_argument("--numpy", action="store_true",
+                        help="score each batch with NumPy; only faster on very large catalogues")
+    parser.add_argument("--rules", default=process_animals.RULES_FILE, help="rule set data file")
+    parser.add_argument("--studied-output", default=process_animals.OUTPUT_FILE,
+                        help="where to write studied animals (JSON Lines if it ends in .jsonl)")
+    return parser.parse_args(argv)
+
+
+def parse_context():
+    """Start method for the parse processes. Forking while fetch threads
+    run could copy a lock some thread holds into the child, so workers
+    come from a fork server (or are spawned where there is none)."""
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+
+
+class Pipeline:
+    """Fetch → parse → score, each stage feeding the next through a
+    bounded queue, so a slow stage makes the ones before it wait instead
+    of piling up pages or records in memory.
+
+    - fetch: the listing pages of every site are crawled at once, as in
+      scraper.crawl_sites, and every detail page found is fetched on a
+      thread pool of ``workers``.
+    - parse: a thread hands each fetched page to a pool of
+      ``parse_workers`` processes (or parses it itself with one worker);
+      pages unchanged since the last run reuse the previous record.
+    - score: a thread takes up to ``chunk_size`` parsed records at a
+      time, normalizes and scores them (as one NumPy batch with
+      ``vectorized``), and appends the raw and studied records to their
+      checkpoints.
+
+    Every stage passes DONE on however it ends. If a stage fails, e.g. a
+    parse process is killed, the run stops: earlier stages stop working
+    but keep draining their queues so nothing blocks, and run() raises
+    the first error once every stage has finished.
+    """
+
+    def __init__(self, raw, studied, previous, sites, workers, parse_workers, queue_size, chunk_size,
+                 vectorized=False):
+        self.raw = raw
+        self.studied = studied
+        self.previous = previous
+        self.sites = sites
+        self.workers = workers
+        self.parse_workers = parse_workers
+        self.chunk_size = chunk_size
+        self.vectorized = vectorized
+        self.pages = queue.Queue(queue_size)
+        self.parsed = queue.Queue(queue_size)
+        self.metrics = scraper.metrics
+        self.error = None
+        self.lock = threading.Lock()
+
+    def fail(self, error):
+        """Stop the run, keeping the first error to raise from run()."""
+        with self.lock:
+            if self.error is None:
+                print(f"  ERROR, stopping: {error!r}")
+                self.error = error
+
+    def fetch(self, url, animal_type, site):
+        if self.error is not None:
+            return
+        try:
+            print(f"  Fetching: {url}")
+            self.pages.put((url, animal_type, site, scraper.client.fetch(url)))
+        except Exception as e:
+            print(f"  ERROR scraping {url}: {e}")
+
+    def parse_stage(self):
+        pool = None
+        pending = queue.Queue(max(1, self.parse_workers) * 2)
+
+        def collect():
+            # Hand results on in submission order, as parse workers finish
+            try:
+                while (item := pending.get()) is not DONE:
+                    url, animal_type, job = item
+                    try:
+                        animal, seconds = job.result() if pool else job()
+                    except BrokenProcessPool as e:
+                        self.fail(e)
+                        continue
+                    except Exception as e:
+                        print(f"  ERROR parsing {url}: {e}")
+                        continue
+                    self.metrics.observe("detail_parse_seconds", seconds)
+                    print(f"  [{animal_type}] Name: {animal['name']}, Images: {len(animal['images'])}")
+                    self.parsed.put(animal)
+            except BaseException as e:
+                self.fail(e)
+                while pending.get() is not DONE:
+                    pass
+
+        collector = threading.Thread(target=collect)
+        collector.start()
+        try:
+            if self.parse_workers > 1:
+                pool = ProcessPoolExecutor(self.parse_workers, mp_context=parse_context(),
+                                           initializer=scraper.use_parser, initargs=(scraper.HTML_PARSER,))
+            while (item := self.pages.get()) is not DONE:
+                if self.error is not None:
+                    continue  # stopping; drain so fetches do not block
+                url, animal_type, site, page = item
+                previous = self.previous.get(url)
+                if scraper.reusable(page, animal_type, previous, site):
+                    print(f"  [{animal_type}] Unchanged: {previous['name']}")
+                    self.parsed.put(scraper.reuse(previous, url))
+                else:
+                    submit = pool.submit if pool else partial
+                    # Sites go to the parse processes by name
+                    pending.put((url, animal_type, submit(timed_parse, url, animal_type, page.content, site.name)))
+        except BaseException as e:
+            self.fail(e)
+            while self.pages.get() is not DONE:
+                pass
+        finally:
+            pending.put(DONE)
+            collector.join()
+            if pool:
+                pool.shutdown(cancel_futures=True)
+            self.parsed.put(DONE)
+
+    def score_stage(self):
+        done = False
+        try:
+            while not done:
+                batch = [self.parsed.get()]
+                while len(batch) < self.chunk_size and not self.parsed.empty():
+                    batch.append(self.parsed.get())
+                if batch[-1] is DONE:
+                    batch.pop()
+                    done = True
+                if self.error is not None:
+                    continue
+                try:
+                    with self.metrics.timer("score_batch_seconds"):
+                        studied = process_animals.process_chunk(batch, self.vectorized)
+                except Exception as e:
+                    print(f"  ERROR scoring {len(batch)} animals: {e}")
+                    continue
+                for animal, record in zip(batch, studied):
+                    self.raw.append(animal)
+                    self.studied.append(record)
+        except BaseException as e:
+            self.fail(e)
+        finally:
+            # Keep taking records so the parse stage never blocks on a full queue
+            while not done:
+                done = self.parsed.get() is DONE
+
+    def run(self):
+        """Crawl every site; returns source URLs site by site, in listing
+        order within each. Raises the first error if a stage failed."""
+        order = {}
+        parser = threading.Thread(target=self.parse_stage)
+        scorer = threading.Thread(target=self.score_stage)
+        parser.start()
+        scorer.start()
+        lock = threading.Lock()
+        try:
+            with ThreadPoolExecutor(max_workers=max(1, self.workers)) as pool:
+
+                def crawl_site(index, site):
+                    def on_page(animal_type, page, urls):
+                        with lock:
+                            for position, url in enumerate(urls):
+                                key = (index, *scraper.listing_order(animal_type, page, position, site))
+                                if url not in order and url not in self.studied:
+                                    pool.submit(self.fetch, url, animal_type, site)
+                                order[url] = min(order.get(url, key), key)
+
+                    scraper.crawl_listings(on_page, site=site)
+
+                with ThreadPoolExecutor(max_workers=max(1, len(self.sites))) as crawlers:
+                    for future in [crawlers.submit(crawl_site, index, site) for index, site in enumerate(self.sites)]:
+                        future.result()
+                print(f"\nFound {len(order)} animals, waiting for detail pages...")
+        finally:
+            self.pages.put(DONE)
+            parser.join()
+            scorer.join()
+        if self.error is not None:
+            raise self.error
+        return [url for url in sorted(order, key=order.get) if url in self.studied]
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    cache = scraper.configure(args)
+    metrics = scraper.metrics
+    process_animals.use_rules(args.rules)
+    os.makedirs(scraper.OUTPUT_DIR, exist_ok=True)
+
+    print("=" * 60)
+    print(f"Crawling, parsing and scoring ({args.workers} fetch workers, {args.parse_workers} parse workers)")
+    print("=" * 60)
+    previous = scraper.load_previous_animals(scraper.DATA_FILE)
+    raw = JsonlCheckpoint(scraper.CHECKPOINT_FILE, "source_url", resume=args.resume)
+    studied = JsonlCheckpoint(STUDIED_CHECKPOINT_FILE, "source_url", resume=args.resume)
+    if args.resume:
+        print(f"Resuming with {len(studied)} animals from {STUDIED_CHECKPOINT_FILE}")
+    pipeline = Pipeline(raw, studied, {} if args.no_cache else previous, scraper.selected_sites(args),
+                        args.workers, args.parse_workers, args.queue_size, args.chunk_size, args.numpy)
+    with metrics.phase("crawl"):
+        try:
+            urls = pipeline.run()
+        except Exception as e:
+            scraper.client.close()
+            sys.exit(f"\nPipeline stopped: {e!r}\n"
+                     f"Animals finished so far are checkpointed; rerun with --resume to keep them")
+
+    def records(checkpoint):
+        if store is None:
+            return checkpoint.records(urls)
+        return (attach_media(animal, store) for animal in checkpoint.records(urls))
+
+    store = None
+    if args.media:
+        print("\n" + "=" * 60)
+        print(f"Media: Storing image variants ({args.media_workers} workers)")
+        print("=" * 60)
+        store = MediaStore(args.media_dir, args.media_format)
+        with metrics.phase("media"):
+            images = [image for animal in raw.records(urls) for image in animal["images"]]
+            failed = process_images(images, scraper.client, store, args.media_workers, metrics)
+        print(f"Stored variants in {args.media_dir}, {failed} images failed")
+
+    print("\n" + "=" * 60)
+    print("Saving data to JSON")
+    print("=" * 60)
+    with metrics.phase("write_animals"):
+        count = write_json_array(scraper.DATA_FILE, records(raw))
+    with metrics.phase("write_delta"):
+        delta = scraper.diff_animals(previous.values(), records(raw))
+        with open(scraper.DELTA_FILE, "w", encoding="utf-8") as f:
+            json.dump(delta, f, ensure_ascii=False, indent=2)
+    with metrics.phase("write_studied"):
+        write_records(args.studied_output, records(studied))
+    raw.remove()
+    studied.remove()
+
+    print(f"\nSaved {count} animals to {scraper.DATA_FILE} and {args.studied_output}")
+    print(f"Delta: {len(delta['added'])} added, {len(delta['removed'])} removed, "
+          f"{len(delta['changed'])} changed → {scraper.DELTA_FILE}")
+    scraper.client.close()
+    if cache:
+        with metrics.phase("evict_cache"):
+            print(f"Evicted {cache.evict()} stale pages from {args.cache_dir}")
+    for url in sorted(scraper.client.failures):
+        print(f"  FAILED: {url}")
+
+    metrics.inc("animals", count)
+    metrics.write_json(args.metrics, failed_urls=sorted(scraper.client.failures))
+    print(f"Metrics → {args.metrics}")
+    if args.prometheus:
+        metrics.write_prometheus(args.prometheus)
+    print("\nDone!")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,76 +1,292 @@
+import hashlib
 import json
 import os
 import re
-import unicodedata
+import sys
+from collections import deque
+from functools import lru_cache
+
+from json_stream import JsonlCheckpoint, iter_json_records, write_records
+from text_normalize import fold
 
 INPUT_FILE = os.path.join(os.path.dirname(__file__), "output", "animals.json")
 OUTPUT_FILE = os.path.join(os.path.dirname(__file__), "output", "studied_animals.json")
 
+# ── Rule set ─────────────────────────────────────────────────────────────────
+# Breed and size maps, score defaults and scoring rules live in a versioned
+# JSON data file, so a shelter can swap in its own rule set without code
+# changes. The file is loaded on first use, not at import, and compiled
+# into a RuleSet (trait indexes, score vectors, keyword matcher). The
+# keyword matcher, the costly part, is cached next to the file as plain
+# JSON (never pickled: a rules directory is data, not code) and reused
+# until the file or this module changes.
+
+RULES_FILE = os.path.join(os.path.dirname(__file__), "rules", "protectoramalaga.json")
+SCORING_VERSION = 2  # bump when normalization or scoring code changes
+
+
+def digest(value):
+    text = json.dumps(value, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class RuleSet:
+    """A rule set data file compiled for fast scoring.
+
+    Traits get a fixed column order (that of default_scores), and every
+    per-breed, per-rule, per-age and per-size table is turned into score
+    vectors or (trait index, delta) pairs over those columns.
+    """
+
+    def __init__(self, data, keyword_matcher=None):
+        self.name = data["name"]
+        self.version = data["version"]
+        self.breed_map = data["breed_map"]
+        self.size_map = data["size_map"]
+        self.default_scores = data["default_scores"]
+        self.breed_defaults = data["breed_defaults"]
+        self.keyword_rules = [(r["keywords"], r["trait"], r["delta"]) for r in data["keyword_rules"]]
+        self.age_adjustments = {(a["min_months"], a["max_months"]): a["deltas"] for a in data["age_adjustments"]}
+        self.size_activity = data["size_activity"]
+
+        self.traits = tuple(sys.intern(trait) for trait in self.default_scores)
+        self.trait_index = {trait: i for i, trait in enumerate(self.traits)}
+        self.default_vector = tuple(self.default_scores.values())
+        self.breed_vectors = {breed: self.vector(scores) for breed, scores in self.breed_defaults.items()}
+        self.keyword_deltas = [self.deltas({trait: delta}) for _, trait, delta in self.keyword_rules]
+        self.age_deltas = [(lo, hi, self.deltas(adjustments))
+                           for (lo, hi), adjustments in self.age_adjustments.items()]
+        self.size_deltas = {size: self.deltas(adjustments) for size, adjustments in self.size_activity.items()}
+        self.keyword_matcher = keyword_matcher or KeywordMatcher(self.keyword_rules)
+        self.global_digest = digest([SCORING_VERSION, self.default_scores])
+        self.keyword_digest = digest(self.keyword_rules)
+
+    def check_traits(self, scores):
+        unknown = set(scores) - set(self.trait_index)
+        if unknown:
+            raise ValueError(f"Rule set {self.name!r} uses traits missing from default_scores: {sorted(unknown)}")
+
+    def vector(self, scores):
+        """Default scores overridden by scores, in trait order."""
+        self.check_traits(scores)
+        return tuple(scores.get(trait, default) for trait, default in self.default_scores.items())
+
+    def deltas(self, adjustments):
+        """{trait: delta} as a tuple of (trait index, delta) pairs."""
+        self.check_traits(adjustments)
+        return tuple((self.trait_index[trait], delta) for trait, delta in adjustments.items())
+
+
+def code_digest():
+    """Hash of this module's source, so that cached matchers are rebuilt
+    whenever the code compiling them changes."""
+    try:
+        with open(__file__, "rb") as f:
+            return hashlib.sha256(f.read()).hexdigest()
+    except OSError:
+        return str(SCORING_VERSION)
+
+
+def load_rules(path):
+    """Load the rule set in path, with its keyword matcher from the JSON
+    cache if up to date."""
+    with open(path, "rb") as f:
+        raw = f.read()
+    key = hashlib.sha256(raw + code_digest().encode("ascii")).hexdigest()[:16]
+    data = json.loads(raw)
+    cache_dir = os.path.join(os.path.dirname(path), "__pycache__")
+    cache_path = os.path.join(cache_dir, f"{os.path.basename(path)}.{key}.json")
+    try:
+        with open(cache_path, "r", encoding="utf-8") as f:
+            return RuleSet(data, KeywordMatcher.from_state(json.load(f)))
+    except (OSError, ValueError, TypeError, KeyError, re.error):
+        pass
+
+    ruleset = RuleSet(data)
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp = f"{cache_path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(ruleset.keyword_matcher.state(), f, ensure_ascii=False)
+        os.replace(tmp, cache_path)
+    except OSError:
+        pass
+    return ruleset
+
+
+active_rules_path = RULES_FILE
+active_rules = None
+
+
+def use_rules(path):
+    """Switch to the rule set in path; it is loaded on first use."""
+    global active_rules, active_rules_path
+    active_rules_path = path
+    active_rules = None
+
+
+def rules():
+    """The active RuleSet, loading it on first use."""
+    global active_rules
+    if active_rules is None:
+        active_rules = load_rules(active_rules_path)
+    return active_rules
+
+
+# Rule tables under their historical module-level names, for callers that
+# read them directly. Resolved lazily so importing stays cheap.
+LEGACY_TABLES = {
+    "BREED_MAP": "breed_map",
+    "SIZE_MAP": "size_map",
+    "DEFAULT_SCORES": "default_scores",
+    "BREED_DEFAULTS": "breed_defaults",
+    "KEYWORD_RULES": "keyword_rules",
+    "AGE_ADJUSTMENTS": "age_adjustments",
+    "SIZE_ACTIVITY": "size_activity",
+    "KEYWORD_MATCHER": "keyword_matcher",
+}
+
+
+def __getattr__(name):
+    if name in LEGACY_TABLES:
+        return getattr(rules(), LEGACY_TABLES[name])
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
 # ── Breed normalization ──────────────────────────────────────────────────────
 
-BREED_MAP = {
-    # Mastín variants
-    "mastin": "Mastín",
-    "mastín": "Mastín",
-    "mastin x": "Mastín Mix",
-    "mastín x": "Mastín Mix",
-    # Pastor Alemán variants
-    "pastor aleman": "Pastor Alemán",
-    "pastor alemán": "Pastor Alemán",
-    "pastor aleman x": "Pastor Alemán Mix",
-    "pastor alemán x": "Pastor Alemán Mix",
-    # Pastor Belga
-    "pastor belga": "Pastor Belga",
-    "pastor belga x": "Pastor Belga Mix",
-    # Malinois
-    "malinois": "Malinois",
-    "malinois x": "Malinois Mix",
-    # Podenco
-    "podenco": "Podenco",
-    "podenco x": "Podenco Mix",
-    # Bodeguero
-    "bodeguero": "Bodeguero",
-    # Labrador
-    "labrador x": "Labrador Mix",
-    # Mestizo
-    "mestizo": "Mestizo",
-    # Cat breeds
-    "comun europeo": "Común Europeo",
-    "comun europea": "Común Europeo",
-    # Specific breeds
-    "alano x": "Alano Mix",
-    "american stanford terrier x": "American Staffordshire Terrier Mix",
-    "amorosos cabezones": "Amorosos Cabezones",
-    "cocker spaniel x": "Cocker Spaniel Mix",
-    "epagneul breton x": "Épagneul Bretón Mix",
-    "gran danes x": "Gran Danés Mix",
-    "perro de agua": "Perro de Agua",
-    "setter inglés": "Setter Inglés",
-    "setter ingles": "Setter Inglés",
-}
+# Scraped breeds come with inconsistent accents, spacing and ways of saying
+# "crossbreed". Exact breed_map keys win; otherwise the breed is folded
+# (lowered, accent-stripped, punctuation and repeated spaces collapsed) and
+# looked up in an index of folded keys, with mix markers handled as tokens
+# and a bounded edit-distance search over a BK-tree for typos.
+
+MIX_TOKENS = frozenset({"x", "mix", "cruce", "cruzado", "cruzada"})
+BREED_CACHE_SIZE = 4096  # distinct raw breed strings remembered
+
+
+def fold_breed(breed):
+    return " ".join(re.findall(r"[a-z0-9]+", fold(breed)))
+
+
+def edit_distance(a, b):
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb)))
+        previous = current
+    return previous[-1]
+
+
+def max_typos(word):
+    """Edits tolerated when matching word: none for very short words."""
+    if len(word) < 4:
+        return 0
+    return 1 if len(word) < 8 else 2
+
+
+class BKTree:
+    """Words indexed by edit distance, for bounded nearest-word search."""
+
+    def __init__(self, words):
+        self.root = None
+        for word in words:
+            self.add(word)
+
+    def add(self, word):
+        if self.root is None:
+            self.root = (word, {})
+            return
+        node = self.root
+        while True:
+            distance = edit_distance(word, node[0])
+            if distance == 0:
+                return
+            if distance not in node[1]:
+                node[1][distance] = (word, {})
+                return
+            node = node[1][distance]
+
+    def nearest(self, word, limit):
+        """The closest word within limit edits (ties go to the smaller
+        word), or None."""
+        best = None
+        stack = [self.root] if self.root else []
+        while stack:
+            candidate, children = stack.pop()
+            distance = edit_distance(word, candidate)
+            if distance <= limit and (best is None or (distance, candidate) < best):
+                best = (distance, candidate)
+            for d, child in children.items():
+                if distance - limit <= d <= distance + limit:
+                    stack.append(child)
+        return best[1] if best else None
+
+
+class BreedResolver:
+    """Maps raw scraped breeds to canonical names, memoizing results.
+
+    breed_map keys are indexed by their folded base breed (mix markers
+    removed), separately for pure and mixed breeds. Typos are corrected
+    on the base breed only, so a pure breed never matches a mix entry.
+    """
+
+    def __init__(self, breed_map):
+        self.breed_map = breed_map
+        self.pure = {}
+        self.mixes = {}
+        for key, canonical in breed_map.items():
+            base, mix = self.split(fold_breed(key))
+            (self.mixes if mix else self.pure).setdefault(base, canonical)
+        self.tree = BKTree(sorted(set(self.pure) | set(self.mixes)))
+        self.resolve = lru_cache(maxsize=BREED_CACHE_SIZE)(self.resolve_uncached)
+
+    @staticmethod
+    def split(folded):
+        """(base breed, whether it was marked as a mix)."""
+        tokens = folded.split()
+        base = [t for t in tokens if t not in MIX_TOKENS]
+        return " ".join(base), len(base) < len(tokens)
+
+    def resolve_uncached(self, breed):
+        if breed.lower() in self.breed_map:
+            return self.breed_map[breed.lower()]
+        base, mix = self.split(fold_breed(breed))
+        if not base:
+            return breed
+        if base not in self.pure and base not in self.mixes:
+            base = self.tree.nearest(base, max_typos(base))
+            if base is None:
+                return breed
+        if not mix:
+            return self.pure.get(base, breed)
+        if base in self.mixes:
+            return self.mixes[base]
+        canonical = self.pure[base]
+        return canonical if canonical.endswith(" Mix") else canonical + " Mix"
+
+
+def breed_resolver():
+    """BreedResolver for the active rule set, built on first use."""
+    r = rules()
+    if getattr(r, "breed_resolver", None) is None:
+        r.breed_resolver = BreedResolver(r.breed_map)
+    return r.breed_resolver
 
 
 def normalize_breed(breed):
     if not breed:
         return "Desconocido"
-    key = breed.strip().lower()
-    return BREED_MAP.get(key, breed.strip())
+    return breed_resolver().resolve(breed.strip())
 
 
 # ── Size normalization ───────────────────────────────────────────────────────
 
-SIZE_MAP = {
-    "pequeño": "small",
-    "mediano": "medium",
-    "grande": "large",
-    "muy grande": "extra_large",
-}
-
-
 def normalize_size(size):
     if not size:
         return "unknown"
-    return SIZE_MAP.get(size.strip().lower(), "unknown")
+    return rules().size_map.get(size.strip().lower(), "unknown")
 
 
 # ── Age normalization (to months) ────────────────────────────────────────────
@@ -91,214 +307,93 @@ def normalize_age_months(age):
 # We score each trait 0-10 by combining:
 #   1) Breed-based defaults (known temperament)
 #   2) Description keyword analysis (Spanish text)
-
-# Breed defaults: (friendly, good_with_animals, leash, reactive, special_needs,
-#                  energy, good_with_humans, shy, activity, trainability, daily_activity)
-DEFAULT_SCORES = {
-    "friendly": 5, "good_with_animals": 5, "leash_trained": 5,
-    "reactive": 3, "special_needs": 0, "energy": 5,
-    "good_with_humans": 5, "shy": 3, "activity": 5,
-    "trainability": 5, "daily_activity_requirement": 5,
-}
-
-BREED_DEFAULTS = {
-    "Mastín": {"friendly": 6, "good_with_animals": 4, "leash_trained": 4,
-               "reactive": 4, "energy": 4, "good_with_humans": 6, "shy": 4,
-               "activity": 4, "trainability": 4, "daily_activity_requirement": 4},
-    "Mastín Mix": {"friendly": 6, "good_with_animals": 4, "leash_trained": 4,
-                   "reactive": 4, "energy": 4, "good_with_humans": 6, "shy": 4,
-                   "activity": 4, "trainability": 4, "daily_activity_requirement": 4},
-    "Pastor Alemán": {"friendly": 6, "good_with_animals": 4, "leash_trained": 6,
-                      "reactive": 5, "energy": 7, "good_with_humans": 6, "shy": 3,
-                      "activity": 7, "trainability": 8, "daily_activity_requirement": 7},
-    "Pastor Alemán Mix": {"friendly": 6, "good_with_animals": 4, "leash_trained": 5,
-                          "reactive": 5, "energy": 7, "good_with_humans": 6, "shy": 3,
-                          "activity": 7, "trainability": 7, "daily_activity_requirement": 7},
-    "Pastor Belga": {"friendly": 5, "good_with_animals": 4, "leash_trained": 6,
-                     "reactive": 5, "energy": 8, "good_with_humans": 6, "shy": 3,
-                     "activity": 8, "trainability": 8, "daily_activity_requirement": 8},
-    "Pastor Belga Mix": {"friendly": 5, "good_with_animals": 4, "leash_trained": 5,
-                         "reactive": 5, "energy": 7, "good_with_humans": 6, "shy": 3,
-                         "activity": 7, "trainability": 7, "daily_activity_requirement": 7},
-    "Malinois": {"friendly": 5, "good_with_animals": 4, "leash_trained": 6,
-                 "reactive": 6, "energy": 9, "good_with_humans": 6, "shy": 2,
-                 "activity": 9, "trainability": 9, "daily_activity_requirement": 9},
-    "Malinois Mix": {"friendly": 5, "good_with_animals": 4, "leash_trained": 5,
-                     "reactive": 5, "energy": 8, "good_with_humans": 6, "shy": 2,
-                     "activity": 8, "trainability": 8, "daily_activity_requirement": 8},
-    "Podenco": {"friendly": 6, "good_with_animals": 5, "leash_trained": 4,
-                "reactive": 5, "energy": 8, "good_with_humans": 6, "shy": 4,
-                "activity": 8, "trainability": 5, "daily_activity_requirement": 8},
-    "Podenco Mix": {"friendly": 6, "good_with_animals": 5, "leash_trained": 4,
-                    "reactive": 5, "energy": 7, "good_with_humans": 6, "shy": 4,
-                    "activity": 7, "trainability": 5, "daily_activity_requirement": 7},
-    "Bodeguero": {"friendly": 7, "good_with_animals": 6, "leash_trained": 5,
-                  "reactive": 3, "energy": 7, "good_with_humans": 8, "shy": 2,
-                  "activity": 7, "trainability": 6, "daily_activity_requirement": 6},
-    "Labrador Mix": {"friendly": 8, "good_with_animals": 7, "leash_trained": 6,
-                     "reactive": 2, "energy": 7, "good_with_humans": 8, "shy": 2,
-                     "activity": 7, "trainability": 7, "daily_activity_requirement": 7},
-    "Mestizo": {"friendly": 5, "good_with_animals": 5, "leash_trained": 5,
-                "reactive": 3, "energy": 5, "good_with_humans": 5, "shy": 3,
-                "activity": 5, "trainability": 5, "daily_activity_requirement": 5},
-    "Común Europeo": {"friendly": 5, "good_with_animals": 4, "leash_trained": 2,
-                      "reactive": 3, "energy": 5, "good_with_humans": 5, "shy": 5,
-                      "activity": 5, "trainability": 4, "daily_activity_requirement": 4},
-    "Alano Mix": {"friendly": 5, "good_with_animals": 3, "leash_trained": 5,
-                  "reactive": 5, "energy": 6, "good_with_humans": 6, "shy": 3,
-                  "activity": 6, "trainability": 6, "daily_activity_requirement": 6},
-    "American Staffordshire Terrier Mix": {"friendly": 6, "good_with_animals": 3, "leash_trained": 5,
-                                           "reactive": 5, "energy": 7, "good_with_humans": 7, "shy": 2,
-                                           "activity": 7, "trainability": 6, "daily_activity_requirement": 7},
-    "Amorosos Cabezones": {"friendly": 7, "good_with_animals": 5, "leash_trained": 5,
-                           "reactive": 3, "energy": 5, "good_with_humans": 7, "shy": 3,
-                           "activity": 5, "trainability": 5, "daily_activity_requirement": 5},
-    "Cocker Spaniel Mix": {"friendly": 7, "good_with_animals": 6, "leash_trained": 6,
-                           "reactive": 3, "energy": 6, "good_with_humans": 7, "shy": 3,
-                           "activity": 6, "trainability": 6, "daily_activity_requirement": 6},
-    "Épagneul Bretón Mix": {"friendly": 7, "good_with_animals": 6, "leash_trained": 5,
-                            "reactive": 3, "energy": 7, "good_with_humans": 7, "shy": 3,
-                            "activity": 7, "trainability": 7, "daily_activity_requirement": 7},
-    "Gran Danés Mix": {"friendly": 7, "good_with_animals": 5, "leash_trained": 5,
-                       "reactive": 3, "energy": 4, "good_with_humans": 7, "shy": 3,
-                       "activity": 4, "trainability": 5, "daily_activity_requirement": 5},
-    "Perro de Agua": {"friendly": 6, "good_with_animals": 5, "leash_trained": 6,
-                      "reactive": 4, "energy": 7, "good_with_humans": 6, "shy": 4,
-                      "activity": 7, "trainability": 7, "daily_activity_requirement": 7},
-    "Setter Inglés": {"friendly": 7, "good_with_animals": 6, "leash_trained": 5,
-                      "reactive": 3, "energy": 7, "good_with_humans": 7, "shy": 3,
-                      "activity": 7, "trainability": 6, "daily_activity_requirement": 7},
-}
-
-
-def strip_accents(s):
-    return "".join(
-        c for c in unicodedata.normalize("NFD", s) if unicodedata.category(c) != "Mn"
-    )
+#   3) Age and size adjustments
+# Keyword rules push a score up or down by their delta when any of their
+# keywords appears in the lowered, accent-stripped description.
 
 
 def desc_lower(description):
     """Return lowered + accent-stripped version for keyword matching."""
     if not description:
         return ""
-    return strip_accents(description.lower())
-
-
-# Each rule: (keywords_list, trait, delta)
-# Positive keywords push a score up, negative ones push it down.
-KEYWORD_RULES = [
-    # ── friendly / social ────────────────────────────────────────────────
-    (["carinoso", "carinosa", "mimoso", "mimosa", "sociable", "simpatico",
-      "simpatica", "dulce", "amoroso", "amorosa", "encantador", "encantadora",
-      "afectuoso", "afectuosa", "muy bueno", "muy buena", "adorable",
-      "se deja acariciar", "le encantan los mimos", "le gusta que le acaricien",
-      "busca caricias", "busca el contacto", "caracter muy bueno"], "friendly", +2),
-    (["desconfiado", "desconfiada", "arisco", "arisca", "no se deja tocar",
-      "no le gusta que le toquen", "distante"], "friendly", -2),
-
-    # ── good with animals ────────────────────────────────────────────────
-    (["se lleva bien con otros perros", "se lleva bien con perros",
-      "compatible con otros", "convive con perros", "convive con gatos",
-      "bueno con otros perros", "buena con otros perros", "juega con otros",
-      "le gustan los perros", "se lleva bien con otros animales",
-      "con otros perros bien", "sociable con perros", "sociable con otros"], "good_with_animals", +2),
-    (["no se lleva bien con perros", "no compatible con", "problemas con otros",
-      "no perros", "sin otros perros", "no convive con perros",
-      "no le gustan los perros", "selectivo con perros", "selectiva con perros",
-      "selectivo con otros", "selectiva con otros"], "good_with_animals", -3),
-
-    # ── leash trained ────────────────────────────────────────────────────
-    (["pasea bien con correa", "pasea genial", "camina bien con correa",
-      "sabe pasear", "pasea muy bien", "le encanta pasear",
-      "le gusta pasear", "le gusta salir a pasear", "sale a pasear",
-      "salir a pasear con correa", "pasea perfectamente"], "leash_trained", +2),
-    (["tira de la correa", "tira mucho", "no sabe pasear",
-      "le cuesta pasear", "necesita aprender a pasear"], "leash_trained", -2),
-
-    # ── reactive ─────────────────────────────────────────────────────────
-    (["reactivo", "reactiva", "reactividad", "ladra a otros perros",
-      "ladra a otros", "se activa", "reacciona", "se pone nervioso con otros",
-      "se pone nerviosa con otros", "tirón", "tirones"], "reactive", +3),
-    (["nada reactivo", "nada reactiva", "tranquilo con otros",
-      "tranquila con otros", "no reacciona", "no ladra"], "reactive", -2),
-
-    # ── special needs ────────────────────────────────────────────────────
-    (["amputacion", "tres patas", "ciego", "ciega", "sordo", "sorda",
-      "leishmania", "leishmaniosis", "medicacion", "tratamiento medico",
-      "enfermedad cronica", "epilepsia", "diabetes", "tumor", "operacion",
-      "necesidades especiales", "atencion veterinaria", "displasia",
-      "problema de salud", "problema cardiaco", "corazon", "atropellado",
-      "atropellada", "fractura", "luxacion", "discapacidad"], "special_needs", +3),
-
-    # ── energy ───────────────────────────────────────────────────────────
-    (["muy activo", "muy activa", "energico", "energica", "inagotable",
-      "necesita actividad", "necesita ejercicio", "necesita mucho ejercicio",
-      "jugueton", "juguetona", "no para", "correr", "muy vital"], "energy", +2),
-    (["tranquilo", "tranquila", "calmado", "calmada", "relajado", "relajada",
-      "casero", "casera", "poco activo", "poco activa", "mayor",
-      "sosegado", "sosegada"], "energy", -2),
-
-    # ── good with humans ─────────────────────────────────────────────────
-    (["le encantan las personas", "bueno con personas", "buena con personas",
-      "le gustan las personas", "adora a las personas", "ninos", "ninas",
-      "familia", "bueno con la gente", "buena con la gente",
-      "se lleva bien con personas", "le gusta la gente", "todo el mundo",
-      "adora a la gente", "con personas genial", "con humanos genial"], "good_with_humans", +2),
-    (["desconfia de personas", "miedo a las personas", "miedo a la gente",
-      "no le gustan las personas", "desconfiado con personas",
-      "desconfiada con personas"], "good_with_humans", -2),
-
-    # ── shy ──────────────────────────────────────────────────────────────
-    (["timido", "timida", "miedoso", "miedosa", "asustadizo", "asustadiza",
-      "desconfiado", "desconfiada", "inseguro", "insegura", "le cuesta",
-      "vergonzoso", "vergonzosa", "miedo", "miedos", "lleno de miedos",
-      "le teme", "le da miedo", "no confia"], "shy", +3),
-    (["seguro de si", "segura de si", "confiado", "confiada",
-      "valiente", "atrevido", "atrevida", "no tiene miedo",
-      "sin miedo", "extrovertido", "extrovertida", "lanzado", "lanzada"], "shy", -2),
-
-    # ── activity ─────────────────────────────────────────────────────────
-    (["activo", "activa", "jugueton", "juguetona", "corretear",
-      "jugar", "le encanta jugar", "senderismo", "caminatas",
-      "explorar", "excursiones", "deporte"], "activity", +2),
-    (["tranquilo", "tranquila", "calmado", "calmada", "mayor",
-      "paseos cortos", "poca actividad", "relajado", "relajada"], "activity", -2),
-
-    # ── trainability ─────────────────────────────────────────────────────
-    (["obediente", "inteligente", "lista", "listo", "aprende rapido",
-      "aprende muy rapido", "facil de adiestrar", "facil de educar",
-      "comandos", "ordenes", "sabe sentarse", "sabe dar la pata",
-      "muy lista", "muy listo", "adiestramiento", "aprender"], "trainability", +2),
-    (["cabezota", "testarudo", "testaruda", "tozudo", "tozuda",
-      "le cuesta aprender", "dificil de educar"], "trainability", -2),
-
-    # ── daily activity requirement ───────────────────────────────────────
-    (["necesita actividad", "necesita ejercicio", "necesita mucho ejercicio",
-      "senderismo", "caminatas largas", "muy activo", "muy activa",
-      "necesita correr", "necesita quemar energia",
-      "requiere actividad", "persona activa"], "daily_activity_requirement", +2),
-    (["paseos cortos", "poca actividad", "tranquilo", "tranquila",
-      "no necesita mucho ejercicio", "mayor", "casero", "casera"], "daily_activity_requirement", -2),
-]
-
-# Age adjustments: puppies are generally more energetic, friendly, trainable
-# Senior dogs tend to be calmer, may have more health needs
-AGE_ADJUSTMENTS = {
-    # (min_months, max_months): {trait: delta}
-    (0, 12): {"energy": +2, "activity": +2, "trainability": +1,
-              "friendly": +1, "daily_activity_requirement": +1, "shy": -1},
-    (12, 36): {"energy": +1, "activity": +1, "trainability": +1},
-    (96, 144): {"energy": -1, "activity": -1, "special_needs": +1,
-                "daily_activity_requirement": -1},
-    (144, 999): {"energy": -2, "activity": -2, "special_needs": +2,
-                 "daily_activity_requirement": -2},
-}
+    return fold(description)
+
+
+class KeywordMatcher:
+    """Finds every rule with a keyword in a description in one scan.
+
+    All keywords are compiled into a single trie-shaped regex, so each
+    position of the text is tried against every keyword at once. The scan
+    restarts one character after each hit, so overlapping keywords are
+    found too. A hit on a keyword also counts for every shorter keyword
+    that is a prefix of it (those would have matched at the same spot).
+    """
+
+    def __init__(self, rules):
+        rules_by_keyword = {}
+        for index, (keywords, _, _) in enumerate(rules):
+            for kw in keywords:
+                rules_by_keyword.setdefault(kw, set()).add(index)
+        self.rules_by_hit = {
+            kw: frozenset().union(*(rules_by_keyword[p] for p in rules_by_keyword if kw.startswith(p)))
+            for kw in rules_by_keyword
+        }
+        self.pattern = re.compile(trie_regex(rules_by_keyword))
 
-# Size adjustments for daily activity
-SIZE_ACTIVITY = {
-    "small": {"daily_activity_requirement": -1, "energy": -1},
-    "extra_large": {"daily_activity_requirement": +1},
-}
+    def state(self):
+        """Plain-data form of the compiled matcher, for the JSON cache."""
+        return {
+            "pattern": self.pattern.pattern,
+            "rules_by_hit": {kw: sorted(indices) for kw, indices in self.rules_by_hit.items()},
+        }
+
+    @classmethod
+    def from_state(cls, state):
+        matcher = cls.__new__(cls)
+        matcher.pattern = re.compile(state["pattern"])
+        matcher.rules_by_hit = {kw: frozenset(indices) for kw, indices in state["rules_by_hit"].items()}
+        return matcher
+
+    def matched_rules(self, text):
+        """Indices of the rules with at least one keyword in text."""
+        matched = set()
+        search = self.pattern.search
+        match = search(text)
+        while match:
+            matched |= self.rules_by_hit[match.group()]
+            match = search(text, match.start() + 1)
+        return matched
+
+
+def trie_regex(words):
+    """Regex matching the longest of words at a position, shaped as a trie."""
+    trie = {}
+    for word in words:
+        node = trie
+        for ch in word:
+            node = node.setdefault(ch, {})
+        node[""] = {}
+
+    def build(node):
+        branches = [re.escape(ch) + build(child) for ch, child in sorted(node.items()) if ch]
+        if not branches:
+            return ""
+        if "" in node:
+            return "(?:" + "|".join(branches) + ")?"
+        if len(branches) == 1:
+            return branches[0]
+        return "(?:" + "|".join(branches) + ")"
+
+    return build(trie)
+
+
+def age_adjustments(age_months):
+    """The age_adjustments bucket containing age_months, as (range, deltas)."""
+    if age_months is not None:
+        for (lo, hi), adjustments in rules().age_adjustments.items():
+            if lo <= age_months < hi:
+                return (lo, hi), adjustments
+    return None
 
 
 def clamp(val, lo=0, hi=10):
@@ -306,80 +401,339 @@ def clamp(val, lo=0, hi=10):
 
 
 def score_animal(animal):
-    breed = animal["breed"]
+    r = rules()
     description = animal.get("description") or ""
     desc = desc_lower(description)
     age_months = animal.get("age_months")
-    size = animal.get("size")
 
     # Start with breed defaults or global defaults
-    scores = dict(DEFAULT_SCORES)
-    if breed in BREED_DEFAULTS:
-        scores.update(BREED_DEFAULTS[breed])
+    scores = list(r.breed_vectors.get(animal["breed"], r.default_vector))
 
-    # Apply keyword rules from description
-    for keywords, trait, delta in KEYWORD_RULES:
-        for kw in keywords:
-            if kw in desc:
-                scores[trait] = scores[trait] + delta
-                break  # only apply each rule once
+    # Apply keyword rules from description, each rule at most once
+    for index in r.keyword_matcher.matched_rules(desc):
+        for trait, delta in r.keyword_deltas[index]:
+            scores[trait] += delta
 
     # Apply age adjustments
     if age_months is not None:
-        for (lo, hi), adjustments in AGE_ADJUSTMENTS.items():
+        for lo, hi, deltas in r.age_deltas:
             if lo <= age_months < hi:
-                for trait, delta in adjustments.items():
-                    scores[trait] = scores[trait] + delta
+                for trait, delta in deltas:
+                    scores[trait] += delta
                 break
 
     # Apply size adjustments
-    if size in SIZE_ACTIVITY:
-        for trait, delta in SIZE_ACTIVITY[size].items():
-            scores[trait] = scores[trait] + delta
+    for trait, delta in r.size_deltas.get(animal.get("size"), ()):
+        scores[trait] += delta
 
     # Clamp all scores to 0-10
-    return {k: clamp(v) for k, v in scores.items()}
+    return {trait: clamp(v) for trait, v in zip(r.traits, scores)}
 
 
-# ── Main ─────────────────────────────────────────────────────────────────────
-
-def main():
-    with open(INPUT_FILE, "r", encoding="utf-8") as f:
-        animals = json.load(f)
-
-    output = []
-    for animal in animals:
-        breed = normalize_breed(animal.get("breed"))
-        size = normalize_size(animal.get("size"))
-        age_months = normalize_age_months(animal.get("age"))
-
-        processed = {
-            "id": animal["id"],
-            "animal_type": animal["animal_type"],
-            "name": animal["name"],
-            "sex": animal["sex"],
-            "breed": breed,
-            "size": size,
-            "age_months": age_months,
-            "description": animal["description"],
-            "images": animal["images"],
-            "videos": animal["videos"],
-            "source_url": animal["source_url"],
-        }
+def numpy():
+    """NumPy, imported on first batch scoring so that importing this
+    module stays cheap; None if it is not installed, in which case batch
+    scoring falls back to score_animal."""
+    try:
+        import numpy
+    except ImportError:
+        return None
+    return numpy
+
+
+class ScoreMatrices:
+    """A RuleSet as NumPy matrices with one column per trait.
+
+    Breed defaults are rows of ``breeds`` (the last row holds the global
+    defaults); keyword rules, age buckets and sizes are rows of delta
+    matrices, with an all-zero last row for "no adjustment".
+    """
+
+    def __init__(self, r):
+        np = numpy()
+        self.breed_row = {breed: i for i, breed in enumerate(r.breed_vectors)}
+        self.breeds = np.array([*r.breed_vectors.values(), r.default_vector], dtype=np.int16)
+        self.keywords = self.delta_matrix(r, r.keyword_deltas)
+        self.age_ranges = [(lo, hi) for lo, hi, _ in r.age_deltas]
+        self.ages = self.delta_matrix(r, [deltas for _, _, deltas in r.age_deltas] + [()])
+        self.size_row = {size: i for i, size in enumerate(r.size_deltas)}
+        self.sizes = self.delta_matrix(r, [*r.size_deltas.values(), ()])
+
+    @staticmethod
+    def delta_matrix(r, rows):
+        np = numpy()
+        matrix = np.zeros((len(rows), len(r.traits)), dtype=np.int16)
+        for i, deltas in enumerate(rows):
+            for trait, delta in deltas:
+                matrix[i, trait] += delta
+        return matrix
+
+    def age_row(self, age_months):
+        if age_months is not None:
+            for i, (lo, hi) in enumerate(self.age_ranges):
+                if lo <= age_months < hi:
+                    return i
+        return len(self.age_ranges)
+
+
+def score_matrices():
+    """ScoreMatrices for the active rule set, built on first use."""
+    r = rules()
+    if getattr(r, "matrices", None) is None:
+        r.matrices = ScoreMatrices(r)
+    return r.matrices
+
+
+def score_matrix(animals):
+    """Scores for a batch of normalized records as an (animals x traits)
+    int16 matrix, columns in rules().traits order.
+
+    Breed rows are gathered, then keyword hits, age buckets and sizes are
+    applied as delta matrix products and row gathers, and everything is
+    clamped with one np.clip.
+    """
+    np = numpy()
+    r = rules()
+    m = score_matrices()
+    default_row = len(m.breed_row)
+    no_size = len(m.size_row)
+    hits = np.zeros((len(animals), len(r.keyword_rules)), dtype=np.int16)
+    breed_rows = []
+    age_rows = []
+    size_rows = []
+    for i, animal in enumerate(animals):
+        hits[i, list(r.keyword_matcher.matched_rules(desc_lower(animal.get("description") or "")))] = 1
+        breed_rows.append(m.breed_row.get(animal["breed"], default_row))
+        age_rows.append(m.age_row(animal.get("age_months")))
+        size_rows.append(m.size_row.get(animal.get("size"), no_size))
+
+    scores = m.breeds[breed_rows] + hits @ m.keywords + m.ages[age_rows] + m.sizes[size_rows]
+    return np.clip(scores, 0, 10, out=scores)
+
+
+def score_animals(animals):
+    """Score a batch of normalized records, one score dict per record.
+
+    Same output as calling score_animal on each, computed with NumPy when
+    it is installed.
+    """
+    if not animals or numpy() is None:
+        return [score_animal(animal) for animal in animals]
+    traits = rules().traits
+    return [dict(zip(traits, row)) for row in score_matrix(animals).tolist()]
 
-        scores = score_animal(processed)
-        processed["scores"] = scores
-        output.append(processed)
 
-    with open(OUTPUT_FILE, "w", encoding="utf-8") as f:
-        json.dump(output, f, ensure_ascii=False, indent=2)
+# ── Main ─────────────────────────────────────────────────────────────────────
 
-    print(f"Processed {len(output)} animals → {OUTPUT_FILE}")
+CHUNK_SIZE = 500  # records per task in batch mode
+
+
+def normalize_animal(animal):
+    """A scraped record with breed, size and age normalized, without scores."""
+    breed = normalize_breed(animal.get("breed"))
+    size = normalize_size(animal.get("size"))
+    age_months = normalize_age_months(animal.get("age"))
+
+    normalized = {
+        "id": animal["id"],
+        "animal_type": animal["animal_type"],
+        "name": animal["name"],
+        "sex": animal["sex"],
+        "breed": breed,
+        "size": size,
+        "age_months": age_months,
+        "description": animal["description"],
+        "images": animal["images"],
+        "videos": animal["videos"],
+        "source_url": animal["source_url"],
+    }
+    if "media" in animal:
+        normalized["media"] = animal["media"]
+    return normalized
+
+
+def process_chunk(chunk, vectorized=False):
+    """Normalize a list of scraped records and attach their trait scores.
+
+    With vectorized, the chunk is scored as one NumPy batch through
+    score_animals. That only pays off on large chunks with many rules; on
+    the shelter's own catalogue score_animal is as fast, so it is the
+    default.
+    """
+    processed = [normalize_animal(animal) for animal in chunk]
+    if vectorized:
+        for record, scores in zip(processed, score_animals(processed)):
+            record["scores"] = scores
+    else:
+        for record in processed:
+            record["scores"] = score_animal(record)
+    return processed
+
+
+# ── Incremental processing ───────────────────────────────────────────────────
+# A record's fingerprint covers the input record plus exactly the rule
+# entries its output depends on, so editing a rule only invalidates the
+# records it can affect. Keyword rules are the exception: any keyword may
+# appear in any text, so they are hashed as a whole and only records
+# without a description are immune to keyword changes.
+
+def fingerprint(animal):
+    r = rules()
+    breed = normalize_breed(animal.get("breed"))
+    size = normalize_size(animal.get("size"))
+    return digest([
+        animal,
+        r.global_digest,
+        breed,
+        size,
+        r.breed_defaults.get(breed),
+        age_adjustments(normalize_age_months(animal.get("age"))),
+        r.size_activity.get(size),
+        r.keyword_digest if animal.get("description") else None,
+    ])
+
+
+def process_incremental(animals, cache, workers=1, chunk_size=CHUNK_SIZE, stats=None, vectorized=False):
+    """Yield (fingerprint, processed record) in input order, reusing the
+    records in ``cache`` whose fingerprint still matches and processing
+    only the rest (through process_all, so workers and vectorized still
+    apply).
+    """
+    plan = deque()  # (fingerprint, cache hit?) for every record read so far
+
+    def misses():
+        for animal in animals:
+            fp = fingerprint(animal)
+            hit = fp in cache
+            plan.append((fp, hit))
+            if not hit:
+                yield animal
+
+    def flush_hits():
+        while plan and plan[0][1]:
+            fp, _ = plan.popleft()
+            if stats is not None:
+                stats["reused"] = stats.get("reused", 0) + 1
+            yield fp, cache.get(fp)["animal"]
+
+    for processed in process_all(misses(), workers, chunk_size, vectorized):
+        yield from flush_hits()
+        fp, _ = plan.popleft()
+        yield fp, processed
+    yield from flush_hits()
+
+
+def chunked(iterable, size):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def process_all(animals, workers=1, chunk_size=CHUNK_SIZE, vectorized=False):
+    """Yield processed records in input order, chunk_size records at a
+    time, see process_chunk.
+
+    With more than one worker, chunks of chunk_size records are processed
+    on a process pool. At most two chunks per worker are in flight at a
+    time, and results are yielded in submission order, so the output
+    matches the serial path exactly.
+    """
+    if workers <= 1:
+        for chunk in chunked(animals, chunk_size):
+            yield from process_chunk(chunk, vectorized)
+        return
+
+    # Imported here: it costs more to import than the rest of this module
+    from concurrent.futures import ProcessPoolExecutor
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=use_rules,
+                             initargs=(active_rules_path,)) as pool:
+        pending = deque()
+        for chunk in chunked(animals, chunk_size):
+            pending.append(pool.submit(process_chunk, chunk, vectorized))
+            if len(pending) >= 2 * workers:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+
+
+def parse_args(argv=None):
+    import argparse  # only the command line needs it
+
+    parser = argparse.ArgumentParser(description="Normalize and score scraped animals")
+    parser.add_argument("--input", default=INPUT_FILE,
+                        help="scraped animals, as a JSON array or JSON Lines")
+    parser.add_argument("--output", default=OUTPUT_FILE,
+                        help="where to write studied animals (JSON Lines if it ends in .jsonl)")
+    parser.add_argument("--rules", default=RULES_FILE,
+                        help="rule set data file (default: rules/protectoramalaga.json)")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="processes to score with; 1 processes serially (default: 1)")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE,
+                        help=f"records per batch in multiprocess mode (default: {CHUNK_SIZE})")
+    parser.add_argument("--numpy", action="store_true",
+                        help="score each batch with NumPy; only faster on very large catalogues")
+    parser.add_argument("--incremental", action="store_true",
+                        help="reuse results for animals whose record and relevant rules are unchanged")
+    parser.add_argument("--cache", default=None,
+                        help="fingerprint cache for --incremental (default: <output>.cache.jsonl)")
+    parser.add_argument("--compact-dir", default=None,
+                        help="also write compact exports for clients here: minified, columnar, "
+                             "filter indexes (.filters.json) and match vectors (.vectors.json), "
+                             "each also gzip/brotli compressed")
+    return parser.parse_args(argv)
+
+
+def count_breeds(records, breeds_count):
+    """Pass records through, tallying breeds as they stream by."""
+    for record in records:
+        breeds_count[record["breed"]] = breeds_count.get(record["breed"], 0) + 1
+        yield record
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    use_rules(args.rules)
+
+    # Records stream from input to output one at a time, so memory stays
+    # flat however large the export is.
+    breeds_count = {}
+    animals = iter_json_records(args.input)
+    if args.incremental:
+        cache_path = args.cache or os.path.splitext(args.output)[0] + ".cache.jsonl"
+        old_cache = JsonlCheckpoint(cache_path, "fingerprint", resume=True)
+        new_cache = JsonlCheckpoint(cache_path + ".new", "fingerprint")
+        stats = {}
+
+        def output_records():
+            for fp, processed in process_incremental(animals, old_cache, args.workers,
+                                                     args.chunk_size, stats, args.numpy):
+                if fp not in new_cache:
+                    new_cache.append({"fingerprint": fp, "animal": processed})
+                yield processed
+
+        count = write_records(args.output, count_breeds(output_records(), breeds_count))
+        old_cache.close()
+        new_cache.close()
+        os.replace(cache_path + ".new", cache_path)
+        print(f"Reused {stats.get('reused', 0)} unchanged animals, processed {count - stats.get('reused', 0)}")
+    else:
+        output = count_breeds(process_all(animals, args.workers, args.chunk_size, args.numpy), breeds_count)
+        count = write_records(args.output, output)
+
+    print(f"Processed {count} animals → {args.output}")
+    if args.compact_dir:
+        import compact_export  # pulls in NumPy; only needed here
+
+        sizes = compact_export.export(args.output, args.compact_dir)
+        print(f"Wrote {len(sizes)} compact exports → {args.compact_dir}")
 
     # Print summary stats
-    breeds_count = {}
-    for a in output:
-        breeds_count[a["breed"]] = breeds_count.get(a["breed"], 0) + 1
     print("\nBreed distribution:")
     for b, c in sorted(breeds_count.items(), key=lambda x: -x[1]):
         print(f"  {c:>3}x  {b}")
@@ -1,221 +1,485 @@
+import argparse
 import json
 import os
-import re
 import sys
-import time
-import uuid
-from urllib.parse import urljoin
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 
 # Ensure real-time output (no buffering)
 sys.stdout.reconfigure(line_buffering=True)
 
-import requests
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, FeatureNotFound
+
+from archive import ReplayClient, ResponseArchive
+from http_client import (
+    BURST,
+    CACHE_MAX_AGE,
+    CACHE_MAX_BYTES,
+    MAX_RETRIES,
+    REQUESTS_PER_SECOND,
+    HostRateLimiter,
+    HttpClient,
+    PageCache,
+)
+from json_stream import JsonlCheckpoint, write_json_array
+from media import MEDIA_WORKERS, MediaStore, attach_media, process_images
+from metrics import Metrics
+from sites import SITES, animal_id, get_site
 
-BASE_URL = "https://www.protectoramalaga.com/"
 OUTPUT_DIR = os.path.join(os.path.dirname(__file__), "output")
 DATA_FILE = os.path.join(OUTPUT_DIR, "animals.json")
+DELTA_FILE = os.path.join(OUTPUT_DIR, "animals_delta.json")
+CHECKPOINT_FILE = os.path.join(OUTPUT_DIR, "animals.checkpoint.jsonl")
+METRICS_FILE = os.path.join(OUTPUT_DIR, "animals_metrics.json")
+MEDIA_DIR = os.path.join(OUTPUT_DIR, "media")
+CACHE_DIR = os.path.join(os.path.dirname(__file__), "cache")
 
 HEADERS = {
     "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
 }
 
-REQUEST_DELAY = 1  # seconds between requests to be polite
+MAX_WORKERS = 8  # concurrent detail-page fetches per site
+LISTING_WORKERS = 4  # concurrent listing-page fetches per site
 
+# The stdlib parser, so that nothing depends on which optional packages
+# are installed; lxml is faster and can be picked with --html-parser, and
+# the site adapters extract the same records with either
+HTML_PARSERS = ["html.parser", "lxml"]
+HTML_PARSER = "html.parser"
 
-def fetch_page(url):
-    time.sleep(REQUEST_DELAY)
+metrics = Metrics()
+client = HttpClient(HEADERS, metrics=metrics)
+
+
+def fetch_page(url, parse_only=None, timer="parse_seconds"):
     print(f"  Fetching: {url}")
-    response = requests.get(url, headers=HEADERS, timeout=30)
-    response.raise_for_status()
-    soup = BeautifulSoup(response.content, "html.parser")
+    content = client.fetch(url).content
+    with metrics.timer(timer):
+        return make_soup(content, url, parse_only)
+
+
+def make_soup(content, url, parse_only=None):
+    soup = BeautifulSoup(content, HTML_PARSER, parse_only=parse_only)
     # Extract <base href> if present, used to resolve relative URLs
     base_tag = soup.find("base", href=True)
     soup._base_url = base_tag["href"] if base_tag else url
     return soup
 
 
-def resolve_url(soup, relative_href):
-    """Resolve a relative href using the page's <base> tag or BASE_URL."""
-    return urljoin(getattr(soup, "_base_url", BASE_URL), relative_href)
+def get_listing_page(listing_url, listing_path, site=None, probe=False):
+    """Extract animal detail URLs and pagination page numbers from a listing page.
+
+    A probe for a page past the end of a listing may find no page at all
+    (404); that counts as an empty page, not as a failed request.
+    """
+    site = get_site(site)
+    if probe:
+        print(f"  Probing: {listing_url}")
+        page = client.fetch(listing_url, missing_ok=True)
+        if page is None:
+            return [], set()
+        with metrics.timer("listing_parse_seconds"):
+            soup = make_soup(page.content, listing_url, site.listing_strainer)
+    else:
+        soup = fetch_page(listing_url, site.listing_strainer, "listing_parse_seconds")
+    return site.parse_listing(soup, listing_url, listing_path)
 
 
-def get_listing_urls(listing_url):
+def get_listing_urls(listing_url, listing_path="perros-en-adopcion", site=None):
     """Extract individual animal detail URLs from a listing page."""
-    soup = fetch_page(listing_url)
-    urls = []
-    for link in soup.find_all("a", href=True):
-        href = link["href"]
-        if "perro-en-adopcion/" in href and href != listing_url:
-            full_url = resolve_url(soup, href)
-            if full_url not in urls:
-                urls.append(full_url)
-    return urls
-
-
-def get_all_animal_urls():
-    """Collect all animal detail URLs from dogs (pages 1-10) and cats (page 1)."""
+    return get_listing_page(listing_url, listing_path, site)[0]
+
+
+def crawl_listings(on_page, workers=LISTING_WORKERS, site=None):
+    """Fetch every listing page of a site concurrently, calling
+    on_page(animal_type, page, urls) on the calling thread as each page
+    returns.
+
+    Page numbers are read from the pagination links, so pages beyond the
+    ones linked from page 1 are discovered as later pages come in. A
+    listing without pagination markup is probed page by page until one
+    comes back empty or missing.
+
+    Raises RuntimeError once the other pages are done if any listing page
+    failed: a catalogue missing that page's animals would list them as
+    removed.
+    """
+    site = get_site(site)
+    failed = []
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        pending = {}
+        requested = set()
+
+        def request(index, page, probe=False):
+            animal_type, listing_path = site.listings[index]
+            if (index, page) not in requested:
+                requested.add((index, page))
+                listing_url = site.listing_url(listing_path, page)
+                future = pool.submit(get_listing_page, listing_url, listing_path, site, probe)
+                pending[future] = (index, page)
+
+        for index in range(len(site.listings)):
+            request(index, 1)
+
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                index, page = pending.pop(future)
+                animal_type = site.listings[index][0]
+                try:
+                    urls, pages = future.result()
+                except Exception as e:
+                    print(f"  ERROR on {site.name} {animal_type} listing page {page}: {e}")
+                    failed.append(f"{animal_type} page {page}")
+                    continue
+                print(f"  {site.name} page {page}: found {len(urls)} {animal_type}s")
+                on_page(animal_type, page, urls)
+                if urls and not pages:
+                    request(index, page + 1, probe=True)
+                for next_page in sorted(pages):
+                    request(index, next_page)
+    if failed:
+        raise RuntimeError(f"{site.name} listing pages failed: {', '.join(failed)}")
+
+
+def listing_order(animal_type, page, position, site=None):
+    """Sort key following the site's listings (dogs before cats), then
+    listing page, then position."""
+    index = [animal_type for animal_type, _ in get_site(site).listings].index(animal_type)
+    return index, page, position
+
+
+def get_all_animal_urls(site=None):
+    """Collect all animal detail URLs from a site's dog and cat listings."""
+    order = {}
+
+    def on_page(animal_type, page, urls):
+        for position, url in enumerate(urls):
+            key = listing_order(animal_type, page, position, site)
+            order[url] = min(order.get(url, key), key)
+
+    print("Collecting dog and cat listing pages...")
+    crawl_listings(on_page, site=site)
     dog_urls = []
     cat_urls = []
+    for url in sorted(order, key=order.get):
+        (dog_urls if order[url][0] == 0 else cat_urls).append(url)
+    return dog_urls, cat_urls
 
-    # Dogs: 10 pages
-    print("Collecting dog listing pages...")
-    for page in range(1, 11):
-        listing_url = urljoin(BASE_URL, f"perros-en-adopcion/{page}/")
-        urls = get_listing_urls(listing_url)
-        if not urls:
-            print(f"  No dogs found on page {page}, stopping.")
-            break
-        dog_urls.extend(urls)
-        print(f"  Page {page}: found {len(urls)} dogs")
-
-    # Cats: check multiple pages
-    print("Collecting cat listing pages...")
-    for page in range(1, 5):
-        listing_url = urljoin(BASE_URL, f"gatos-en-adopcion/{page}/")
-        try:
-            urls = get_listing_urls(listing_url)
-        except requests.HTTPError:
-            break
-        if not urls:
-            break
-        cat_urls.extend(urls)
-        print(f"  Page {page}: found {len(urls)} cats")
 
-    return dog_urls, cat_urls
+def parse_animal_detail(url, animal_type, soup=None, site=None):
+    """Parse an individual animal detail page, fetching it unless given."""
+    site = get_site(site)
+    if soup is None:
+        soup = fetch_page(url, site.detail_strainer, "detail_parse_seconds")
+    animal = site.parse_detail(url, animal_type, soup)
+    animal["extractor_version"] = site.extractor_version
+    return animal
 
 
-def parse_animal_detail(url, animal_type):
-    """Parse an individual animal detail page."""
-    soup = fetch_page(url)
-
-    animal = {
-        "id": str(uuid.uuid4()),
-        "animal_type": animal_type,
-        "name": None,
-        "sex": None,
-        "breed": None,
-        "size": None,
-        "reference": None,
-        "age": None,
-        "description": None,
-        "images": [],
-        "videos": [],
-        "source_url": url,
-    }
-
-    # Name: first h2 on the page
-    h2 = soup.find("h2")
-    if h2:
-        animal["name"] = h2.get_text(strip=True)
-
-    # Fields from h4 tags
-    field_mapping = {
-        "sexo": "sex",
-        "raza": "breed",
-        "tamaño": "size",
-        "ref": "reference",
-        "edad aproximada": "age",
-    }
-
-    for h4 in soup.find_all("h4"):
-        text = h4.get_text(strip=True)
-        for spanish_key, english_key in field_mapping.items():
-            if text.lower().startswith(spanish_key):
-                # Extract value after the colon
-                parts = text.split(":", 1)
-                if len(parts) == 2:
-                    animal[english_key] = parts[1].strip()
-                break
-
-    # Description: collect p tags that contain descriptive text
-    # Skip p tags that are part of navigation, headers, or very short
-    description_parts = []
-    for p in soup.find_all("p"):
-        text = p.get_text(strip=True)
-        # Filter out navigation, footer, and short non-descriptive paragraphs
-        if len(text) > 50 and not text.startswith("Página") and "cookie" not in text.lower():
-            description_parts.append(text)
-    if description_parts:
-        animal["description"] = "\n\n".join(description_parts)
-
-    # Images: links to high-res images in imagenes/catalogos/high/
-    for link in soup.find_all("a", href=True):
-        href = link["href"]
-        if "imagenes/catalogos/high/" in href:
-            image_url = resolve_url(soup, href)
-            if image_url not in animal["images"]:
-                animal["images"].append(image_url)
-
-    # Also check img tags for images not wrapped in links
-    if not animal["images"]:
-        for img in soup.find_all("img", src=True):
-            src = img["src"]
-            if "imagenes/catalogos/" in src:
-                image_url = resolve_url(soup, src.replace("/low/", "/high/"))
-                if image_url not in animal["images"]:
-                    animal["images"].append(image_url)
-
-    # Videos: YouTube links
-    for link in soup.find_all("a", href=True):
-        href = link["href"]
-        if "youtube.com" in href or "youtu.be" in href:
-            if href not in animal["videos"]:
-                animal["videos"].append(href)
-
-    # Also check for iframe embeds
-    for iframe in soup.find_all("iframe", src=True):
-        src = iframe["src"]
-        if "youtube.com" in src or "youtu.be" in src:
-            if src not in animal["videos"]:
-                animal["videos"].append(src)
+def use_parser(name):
+    """Parse pages with the BeautifulSoup parser name from now on."""
+    global HTML_PARSER
+    HTML_PARSER = name
+
+
+def scrape_animal(url, animal_type, previous=None, site=None):
+    """Scrape a single detail page, returning None if it fails.
+
+    When the page is unchanged since the last run and ``previous`` holds
+    the record parsed from it, that record is reused without parsing.
+    """
+    try:
+        print(f"  Fetching: {url}")
+        page = client.fetch(url)
+        if reusable(page, animal_type, previous, site):
+            print(f"  [{animal_type}] Unchanged: {previous['name']}")
+            return reuse(previous, url)
+        with metrics.timer("detail_parse_seconds"):
+            animal = parse_detail_html(url, animal_type, page.content, site)
+    except Exception as e:
+        print(f"  ERROR scraping {url}: {e}")
+        return None
+    print(f"  [{animal_type}] Name: {animal['name']}, Images: {len(animal['images'])}, Videos: {len(animal['videos'])}")
+    return animal
+
 
+def reusable(page, animal_type, previous, site=None):
+    """Whether previous, the record parsed from page last run, still holds:
+    the page is unchanged and was parsed by the same extractor version."""
+    return (
+        not page.changed
+        and previous is not None
+        and previous.get("animal_type") == animal_type
+        and previous.get("extractor_version") == get_site(site).extractor_version
+    )
+
+
+def reuse(previous, url):
+    """previous as this run's record of url. Its ``media`` list is dropped:
+    attach_media adds it again on --media runs, and without --media the
+    stored variants it points to may be gone."""
+    animal = {key: value for key, value in previous.items() if key != "media"}
+    animal["id"] = animal_id(url)
     return animal
 
 
-def main():
+def parse_detail_html(url, animal_type, content, site=None):
+    """parse_animal_detail over an already fetched detail page body."""
+    site = get_site(site)
+    return parse_animal_detail(url, animal_type, make_soup(content, url, site.detail_strainer), site)
+
+
+def scrape_to_checkpoint(url, animal_type, previous, checkpoint, site=None):
+    animal = scrape_animal(url, animal_type, previous, site)
+    if animal is not None:
+        checkpoint.append(animal)
+
+
+def crawl(checkpoint, workers=MAX_WORKERS, previous=None, site=None):
+    """Discover and scrape every animal of a site as a producer/consumer
+    pipeline.
+
+    Detail pages are queued on the worker pool as soon as the listing page
+    that links them returns, so scraping overlaps listing discovery. An
+    animal linked from several pages is scraped once, and animals already
+    in the checkpoint (from an interrupted run) are not scraped again.
+    Each record is appended to the checkpoint as soon as it is parsed.
+
+    Returns the source URLs of the scraped animals in listing order,
+    regardless of completion order, so the output file stays stable
+    between runs. ``previous`` maps source_url to the records of the last
+    run, reused for pages that did not change.
+    """
+    previous = previous or {}
+    order = {}
+    futures = []
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+
+        def on_page(animal_type, page, urls):
+            for position, url in enumerate(urls):
+                key = listing_order(animal_type, page, position, site)
+                if url not in order and url not in checkpoint:
+                    futures.append(pool.submit(scrape_to_checkpoint, url, animal_type,
+                                               previous.get(url), checkpoint, site))
+                order[url] = min(order.get(url, key), key)
+
+        crawl_listings(on_page, site=site)
+        print(f"\nFound {len(order)} {get_site(site).name} animals, {len(order) - len(futures)} "
+              f"already checkpointed, waiting for detail pages...")
+        for future in futures:
+            future.result()
+    return [url for url in sorted(order, key=order.get) if url in checkpoint]
+
+
+def crawl_sites(checkpoint, sites, workers=MAX_WORKERS, previous=None):
+    """crawl every site at once, each on its own worker pool, into one
+    checkpoint. The rate limiter keeps each site's host to its own pace.
+
+    Returns the source URLs of all scraped animals, site by site in the
+    order given and in listing order within a site. Records are keyed by
+    source URL and their ids derive from it, so the merged catalogue has
+    one record per animal page however the sites' crawls interleave.
+    """
+    with ThreadPoolExecutor(max_workers=max(1, len(sites))) as pool:
+        futures = [pool.submit(crawl, checkpoint, workers, previous, site) for site in sites]
+        return list(dict.fromkeys(url for future in futures for url in future.result()))
+
+
+def load_previous_animals(path):
+    """Map source_url to the records of the last run, if there was one."""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return {animal["source_url"]: animal for animal in json.load(f)}
+    except (OSError, ValueError):
+        return {}
+
+
+def diff_animals(old, new):
+    """Delta between two collections of animal records, matched by id.
+
+    ``new`` is consumed once, so it can be a stream of records.
+    ``changed`` entries carry only the fields that differ, as
+    ``{"old": ..., "new": ...}`` pairs, so clients can patch records in place.
+    A new extractor_version alone is not a change clients need to see.
+    """
+    old_by_id = {animal["id"]: animal for animal in old}
+    new_ids = set()
+    added = []
+    changed = []
+    for animal in new:
+        new_ids.add(animal["id"])
+        before = old_by_id.get(animal["id"])
+        if before is None:
+            added.append(animal)
+            continue
+        fields = {
+            key: {"old": before.get(key), "new": animal.get(key)}
+            for key in dict.fromkeys([*before, *animal])
+            if before.get(key) != animal.get(key) and key != "extractor_version"
+        }
+        if fields:
+            changed.append({"id": animal["id"], "fields": fields})
+    removed = [animal_id for animal_id in old_by_id if animal_id not in new_ids]
+    return {"added": added, "removed": removed, "changed": changed}
+
+
+def build_parser(**kwargs):
+    """The scraper's argument parser; kwargs go to ArgumentParser, e.g.
+    add_help=False to use it as a parent parser."""
+    parser = argparse.ArgumentParser(description="Scrape adoptable animals from shelter websites", **kwargs)
+    parser.add_argument("--site", dest="sites", action="append", choices=list(SITES),
+                        help="shelter site to crawl; repeat to crawl several at once (default: all of them)")
+    parser.add_argument("--html-parser", choices=HTML_PARSERS, default=HTML_PARSER,
+                        help=f"BeautifulSoup parser; lxml is faster if installed (default: {HTML_PARSER})")
+    parser.add_argument("--workers", type=int, default=MAX_WORKERS,
+                        help=f"concurrent detail-page fetches per site (default: {MAX_WORKERS})")
+    parser.add_argument("--rate", type=float, default=None,
+                        help=f"max requests per second per host (default: the site's own, else {REQUESTS_PER_SECOND})")
+    parser.add_argument("--burst", type=int, default=None,
+                        help=f"requests allowed back-to-back per host (default: the site's own, else {BURST})")
+    parser.add_argument("--pool-size", type=int, default=None,
+                        help="keep-alive connections per host (default: same as --workers)")
+    parser.add_argument("--retries", type=int, default=MAX_RETRIES,
+                        help=f"retries on connection errors, 429 and 5xx (default: {MAX_RETRIES})")
+    parser.add_argument("--resume", action="store_true",
+                        help="keep animals checkpointed by an interrupted run instead of starting over")
+    parser.add_argument("--cache-dir", default=CACHE_DIR,
+                        help="on-disk page cache used for conditional requests")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="download and parse every page, ignoring the page cache")
+    parser.add_argument("--cache-max-age", type=float, default=CACHE_MAX_AGE / 86400,
+                        help=f"evict cached pages unused for this many days (default: {CACHE_MAX_AGE // 86400})")
+    parser.add_argument("--cache-max-mb", type=float, default=CACHE_MAX_BYTES / 2**20,
+                        help=f"evict least recently used pages above this size (default: {CACHE_MAX_BYTES // 2**20})")
+    archive = parser.add_mutually_exclusive_group()
+    archive.add_argument("--record", metavar="DIR", default=None,
+                         help="also save every raw response into a compressed archive for --replay")
+    archive.add_argument("--replay", metavar="DIR", default=None,
+                         help="crawl from an archive written by --record: no network, no rate limits")
+    parser.add_argument("--metrics", default=METRICS_FILE,
+                        help="where to write the run's timing and metrics summary as JSON")
+    parser.add_argument("--prometheus", default=None,
+                        help="also write metrics in Prometheus text format, e.g. for node exporter's textfile collector")
+    parser.add_argument("--media", action="store_true",
+                        help="download images and store resized thumbnail and card variants (needs Pillow)")
+    parser.add_argument("--media-dir", default=MEDIA_DIR,
+                        help="content-addressed store for image variants")
+    parser.add_argument("--media-workers", type=int, default=MEDIA_WORKERS,
+                        help=f"concurrent image downloads (default: {MEDIA_WORKERS})")
+    parser.add_argument("--media-format", choices=["webp", "jpeg"], default=None,
+                        help="variant format (default: webp if Pillow supports it, else jpeg)")
+    return parser
+
+
+def parse_args(argv=None):
+    return build_parser().parse_args(argv)
+
+
+def selected_sites(args):
+    """The site adapters picked on the command line."""
+    return [SITES[name] for name in dict.fromkeys(args.sites or SITES)]
+
+
+def configure(args):
+    """Set up the shared HTTP client and metrics from the command line.
+    Returns the page cache, or None with --no-cache or --replay."""
+    global client, metrics
+    metrics = Metrics()
+    try:
+        BeautifulSoup("", args.html_parser)
+    except FeatureNotFound:
+        sys.exit(f"--html-parser {args.html_parser} is not installed: pip install {args.html_parser}")
+    use_parser(args.html_parser)
+    if args.replay:
+        client = ReplayClient(ResponseArchive(args.replay), metrics)
+        return None
+    cache = None
+    if not args.no_cache:
+        cache = PageCache(args.cache_dir, max_age=args.cache_max_age * 86400,
+                          max_bytes=int(args.cache_max_mb * 2**20))
+    limits = {site.host: (args.rate or site.rate, args.burst or site.burst) for site in selected_sites(args)}
+    rate_limiter = HostRateLimiter(args.rate or REQUESTS_PER_SECOND, args.burst or BURST, limits)
+    archive = ResponseArchive(args.record) if args.record else None
+    client = HttpClient(HEADERS, pool_size=args.pool_size or args.workers, max_retries=args.retries,
+                        rate_limiter=rate_limiter, cache=cache, metrics=metrics, archive=archive)
+    return cache
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    cache = configure(args)
+
     os.makedirs(OUTPUT_DIR, exist_ok=True)
 
-    # Step 1: Collect all animal URLs
+    # Step 1: Collect animal URLs from listing pages and scrape each animal
+    # page as soon as it is discovered
     print("=" * 60)
-    print("Step 1: Collecting animal URLs from listing pages")
-    print("=" * 60)
-    dog_urls, cat_urls = get_all_animal_urls()
-    print(f"\nFound {len(dog_urls)} dogs and {len(cat_urls)} cats")
-
-    # Step 2: Scrape individual animal pages
-    print("\n" + "=" * 60)
-    print("Step 2: Scraping individual animal pages")
+    sites = selected_sites(args)
+    print(f"Step 1: Crawling listing and animal pages of {', '.join(site.name for site in sites)} "
+          f"({args.workers} workers per site)")
     print("=" * 60)
-    animals = []
-
-    for i, url in enumerate(dog_urls, 1):
-        print(f"\n[Dog {i}/{len(dog_urls)}]")
-        try:
-            animal = parse_animal_detail(url, "dog")
-            animals.append(animal)
-            print(f"  Name: {animal['name']}, Images: {len(animal['images'])}, Videos: {len(animal['videos'])}")
-        except Exception as e:
-            print(f"  ERROR scraping {url}: {e}")
-
-    for i, url in enumerate(cat_urls, 1):
-        print(f"\n[Cat {i}/{len(cat_urls)}]")
+    if args.replay:
+        print(f"Replaying recorded responses from {args.replay}")
+    previous = load_previous_animals(DATA_FILE)
+    checkpoint = JsonlCheckpoint(CHECKPOINT_FILE, "source_url", resume=args.resume)
+    if args.resume:
+        print(f"Resuming with {len(checkpoint)} animals from {CHECKPOINT_FILE}")
+    with metrics.phase("crawl"):
         try:
-            animal = parse_animal_detail(url, "cat")
-            animals.append(animal)
-            print(f"  Name: {animal['name']}, Images: {len(animal['images'])}, Videos: {len(animal['videos'])}")
-        except Exception as e:
-            print(f"  ERROR scraping {url}: {e}")
-
-    # Step 3: Save JSON with image URLs
+            urls = crawl_sites(checkpoint, sites, args.workers, {} if args.no_cache else previous)
+        except RuntimeError as e:
+            client.close()
+            sys.exit(f"\nCrawl stopped, {DATA_FILE} left as it was: {e}\n"
+                     f"Animals finished so far are checkpointed; rerun with --resume to keep them")
+
+    store = None
+    if args.media:
+        print("\n" + "=" * 60)
+        print(f"Media: Storing image variants ({args.media_workers} workers)")
+        print("=" * 60)
+        store = MediaStore(args.media_dir, args.media_format)
+        with metrics.phase("media"):
+            images = [image for animal in checkpoint.records(urls) for image in animal["images"]]
+            failed = process_images(images, client, store, args.media_workers, metrics)
+        print(f"Stored variants in {args.media_dir}, {failed} images failed")
+
+    def records():
+        if store is None:
+            return checkpoint.records(urls)
+        return (attach_media(animal, store) for animal in checkpoint.records(urls))
+
+    # Step 2: Save JSON with image URLs
     print("\n" + "=" * 60)
-    print("Step 3: Saving data to JSON")
+    print("Step 2: Saving data to JSON")
     print("=" * 60)
 
-    with open(DATA_FILE, "w", encoding="utf-8") as f:
-        json.dump(animals, f, ensure_ascii=False, indent=2)
-
-    print(f"\nSaved {len(animals)} animals to {DATA_FILE}")
+    with metrics.phase("write_animals"):
+        count = write_json_array(DATA_FILE, records())
+
+    with metrics.phase("write_delta"):
+        delta = diff_animals(previous.values(), records())
+        with open(DELTA_FILE, "w", encoding="utf-8") as f:
+            json.dump(delta, f, ensure_ascii=False, indent=2)
+    checkpoint.remove()
+
+    print(f"\nSaved {count} animals to {DATA_FILE}")
+    print(f"Delta: {len(delta['added'])} added, {len(delta['removed'])} removed, "
+          f"{len(delta['changed'])} changed → {DELTA_FILE}")
+    client.close()
+    if cache:
+        with metrics.phase("evict_cache"):
+            print(f"Evicted {cache.evict()} stale pages from {args.cache_dir}")
+
+    if client.retries:
+        print(f"Retried {sum(client.retries.values())} requests across {len(client.retries)} URLs")
+    for url in sorted(client.failures):
+        print(f"  FAILED: {url}")
+
+    metrics.inc("animals", count)
+    metrics.write_json(args.metrics, failed_urls=sorted(client.failures))
+    print(f"Metrics → {args.metrics}")
+    if args.prometheus:
+        metrics.write_prometheus(args.prometheus)
     print("\nDone!")
 
 
@@ -0,0 +1,245 @@
+import re
+import uuid
+from urllib.parse import urljoin, urlsplit
+
+from bs4 import CData, NavigableString, SoupStrainer
+
+from http_client import BURST, REQUESTS_PER_SECOND
+from text_normalize import fold
+
+DEFAULT_SITE = "protectoramalaga"
+
+# Bump when extraction code shared by every site (new_animal,
+# parse_listing, paragraph_text, the scraper's soup building) changes the
+# records it produces; bump an adapter's own ``version`` for changes to
+# one site
+EXTRACTOR_VERSION = 2
+
+
+def animal_id(source_url):
+    """Deterministic id for an animal, stable across crawls of the same page."""
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, source_url))
+
+
+def new_animal(url, animal_type):
+    """An animal record with every field empty, as adapters fill it in."""
+    return {
+        "id": animal_id(url),
+        "animal_type": animal_type,
+        "name": None,
+        "sex": None,
+        "breed": None,
+        "size": None,
+        "reference": None,
+        "age": None,
+        "description": None,
+        "images": [],
+        "videos": [],
+        "source_url": url,
+    }
+
+
+def is_video(url):
+    return "youtube.com" in url or "youtu.be" in url
+
+
+def paragraph_text(tag):
+    """Stripped text of a <p>, up to the first <p> nested in it.
+
+    A <p> start tag closes any open paragraph, which is how lxml builds
+    the tree, but html.parser nests the second paragraph inside the
+    first, whose text would then repeat it. Stopping at the nested <p>
+    gives the same text with either parser.
+    """
+    if tag.find("p") is None:
+        return tag.get_text(strip=True)
+    parts = []
+    for element in tag.descendants:
+        if element.name == "p":
+            break
+        if type(element) in (NavigableString, CData):
+            text = element.strip()
+            if text:
+                parts.append(text)
+    return "".join(parts)
+
+
+class SiteAdapter:
+    """What the scraper needs to know about one shelter's website: where
+    its listings are, how to tell detail links from pagination, how to
+    read an animal from a detail page, and how fast it may be crawled.
+
+    Subclasses set ``name``, ``base_url`` and ``listings`` and implement
+    is_detail_link and parse_detail; listing pages are expected at
+    ``<listing path>/<page>/``, otherwise override listing_url and
+    page_number too.
+    """
+
+    name = None
+    base_url = None
+    # Bump when parse_detail changes, so that pages unchanged since the
+    # last crawl are parsed again instead of reusing stale records
+    version = 1
+    # (animal_type, listing path), crawled in this order
+    listings = []
+    # Politeness towards the site's host; --rate and --burst override them
+    rate = REQUESTS_PER_SECOND
+    burst = BURST
+    # Only build the parts of the tree the extractors read
+    listing_tags = ["base", "a"]
+    detail_tags = ["base", "h2", "h4", "p", "a", "img", "iframe"]
+
+    def __init__(self, base_url=None):
+        if base_url is not None:
+            self.base_url = base_url
+        self.listing_strainer = SoupStrainer(self.listing_tags)
+        self.detail_strainer = SoupStrainer(self.detail_tags)
+        self.page_links = {
+            listing_path: re.compile(re.escape(listing_path) + r"/(\d+)/?$")
+            for _, listing_path in self.listings
+        }
+
+    @property
+    def extractor_version(self):
+        """Identifies the code that extracted a record, as stored in it."""
+        return f"{self.name}/{EXTRACTOR_VERSION}.{self.version}"
+
+    @property
+    def host(self):
+        return urlsplit(self.base_url).netloc
+
+    def resolve(self, soup, relative_href):
+        """Resolve a relative href using the page's <base> tag or base_url."""
+        return urljoin(getattr(soup, "_base_url", self.base_url), relative_href)
+
+    def listing_url(self, listing_path, page):
+        return urljoin(self.base_url, f"{listing_path}/{page}/")
+
+    def page_number(self, listing_path, href):
+        """The listing page an href points to, or None."""
+        match = self.page_links[listing_path].search(href)
+        return int(match.group(1)) if match else None
+
+    def is_detail_link(self, href):
+        raise NotImplementedError
+
+    def parse_listing(self, soup, listing_url, listing_path):
+        """Animal detail URLs and pagination page numbers of a listing page."""
+        urls = {}
+        pages = set()
+        for link in soup.find_all("a", href=True):
+            href = link["href"]
+            if self.is_detail_link(href) and href != listing_url:
+                urls[self.resolve(soup, href)] = None
+            else:
+                page = self.page_number(listing_path, href)
+                if page is not None:
+                    pages.add(page)
+        return list(urls), pages
+
+    def parse_detail(self, url, animal_type, soup):
+        """The animal record of a detail page, see new_animal."""
+        raise NotImplementedError
+
+
+class ProtectoraMalaga(SiteAdapter):
+    name = "protectoramalaga"
+    base_url = "https://www.protectoramalaga.com/"
+    listings = [
+        ("dog", "perros-en-adopcion"),
+        ("cat", "gatos-en-adopcion"),
+    ]
+
+    FIELD_MAPPING = {
+        "sexo": "sex",
+        "raza": "breed",
+        "tamaño": "size",
+        "ref": "reference",
+        "edad aproximada": "age",
+    }
+    # Labels are matched lowered and accent-stripped, so "Tamano:" still counts
+    FIELD_LABELS = [(fold(spanish_key), english_key) for spanish_key, english_key in FIELD_MAPPING.items()]
+
+    DETAIL_LINK = "perro-en-adopcion/"  # used for cats too
+    IMAGE_LINK = "imagenes/catalogos/high/"
+    INLINE_IMAGE = "imagenes/catalogos/"
+
+    def is_detail_link(self, href):
+        return self.DETAIL_LINK in href
+
+    def parse_detail(self, url, animal_type, soup):
+        animal = new_animal(url, animal_type)
+
+        # One pass over the tags we care about, in document order
+        h2_seen = False
+        description_parts = []
+        image_links = []
+        inline_images = []
+        video_links = []
+        embedded_videos = []
+        for tag in soup.find_all(self.detail_tags):
+            if tag.name == "h2":
+                # Name: first h2 on the page
+                if not h2_seen:
+                    animal["name"] = tag.get_text(strip=True)
+                    h2_seen = True
+
+            elif tag.name == "h4":
+                # Fields from h4 tags
+                text = tag.get_text(strip=True)
+                label = fold(text)
+                for spanish_key, english_key in self.FIELD_LABELS:
+                    if label.startswith(spanish_key):
+                        # Extract value after the colon
+                        parts = text.split(":", 1)
+                        if len(parts) == 2:
+                            animal[english_key] = parts[1].strip()
+                        break
+
+            elif tag.name == "p":
+                # Description: skip navigation, footer, and short non-descriptive paragraphs
+                text = paragraph_text(tag)
+                if len(text) > 50 and not text.startswith("Página") and "cookie" not in fold(text):
+                    description_parts.append(text)
+
+            elif tag.name == "a":
+                href = tag.get("href")
+                if href is None:
+                    continue
+                # Images: links to high-res images in imagenes/catalogos/high/
+                if self.IMAGE_LINK in href:
+                    image_links.append(self.resolve(soup, href))
+                # Videos: YouTube links
+                if is_video(href):
+                    video_links.append(href)
+
+            elif tag.name == "img":
+                # Images not wrapped in links, only used if there are no links
+                src = tag.get("src")
+                if src is not None and self.INLINE_IMAGE in src:
+                    inline_images.append(self.resolve(soup, src.replace("/low/", "/high/")))
+
+            elif tag.name == "iframe":
+                # Videos: YouTube iframe embeds
+                src = tag.get("src")
+                if src is not None and is_video(src):
+                    embedded_videos.append(src)
+
+        if description_parts:
+            animal["description"] = "\n\n".join(description_parts)
+        animal["images"] = list(dict.fromkeys(image_links or inline_images))
+        animal["videos"] = list(dict.fromkeys(video_links + embedded_videos))
+        return animal
+
+
+# Every shelter the scraper knows, by name; add an adapter here to crawl
+# another one
+SITES = {site.name: site for site in [ProtectoraMalaga()]}
+
+
+def get_site(site=None):
+    """The adapter for site: an adapter, a registered name, or None for
+    the default site."""
+    if isinstance(site, SiteAdapter):
+        return site
+    return SITES[site or DEFAULT_SITE]
@@ -0,0 +1,52 @@
+import unicodedata
+from functools import lru_cache
+
+# fold() remembers short texts, such as field labels and breeds, which
+# repeat across pages; descriptions are nearly all distinct and are not
+# kept
+FOLD_CACHE_MAX_LENGTH = 64
+FOLD_CACHE_SIZE = 1024
+
+
+def strip_accents(s):
+    """Drop combining marks after canonical decomposition ("ñ" -> "n")."""
+    return "".join(
+        c for c in unicodedata.normalize("NFD", s) if unicodedata.category(c) != "Mn"
+    )
+
+
+class FoldTable(dict):
+    """str.translate table lowering and accent-stripping one character.
+
+    Entries are computed the first time a character is seen, with the
+    same lower() + NFD rules as strip_accents(text.lower()), so the table
+    only ever holds the alphabet the corpus actually uses.
+    """
+
+    def __missing__(self, codepoint):
+        folded = strip_accents(chr(codepoint).lower())
+        self[codepoint] = folded
+        return folded
+
+
+FOLD_TABLE = FoldTable()
+
+
+def fold(text):
+    """Lowered, accent-stripped text, in one translate() pass.
+
+    Same result as strip_accents(text.lower()).
+    """
+    if len(text) <= FOLD_CACHE_MAX_LENGTH:
+        return fold_short(text)
+    return fold_text(text)
+
+
+def fold_text(text):
+    if "Σ" in text:
+        # lower() picks final or medial sigma from context; not per character
+        return strip_accents(text.lower())
+    return text.translate(FOLD_TABLE)
+
+
+fold_short = lru_cache(maxsize=FOLD_CACHE_SIZE)(fold_text)